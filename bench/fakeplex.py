@@ -0,0 +1,163 @@
+"""Minimal stand-in for the Plex endpoints rescan uses, serving a tree made by generate_tree.py.
+
+Serves /, /library/sections, paged /library/sections/{id}/all (movies and episodes,
+including the addedAt/updatedAt filters used for incremental syncs) and
+/library/sections/{id}/refresh. Every response can be delayed to mimic a remote or busy
+server. Request counts are available as JSON on /bench/stats and cleared by /bench/reset.
+
+    python bench/fakeplex.py /tmp/bench-tree --port 32410 --latency 0.02
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from xml.sax.saxutils import quoteattr
+
+ITEM_TYPES = {'movie': 'movie', 'show': 'episode'}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve a fake Plex library for benchmarks.")
+    parser.add_argument('root', help="Tree created by generate_tree.py")
+    parser.add_argument('--port', type=int, default=32410, help="Port to listen on (default: 32410)")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds to delay every response (default: 0)")
+    parser.add_argument('--extra-items', type=int, default=0,
+                        help="Items per section that Plex lists but that are not on disk (default: 0)")
+    parser.add_argument('--refresh-time', type=float, default=1.0,
+                        help="Seconds a section reports refreshing after a refresh request (default: 1)")
+    return parser.parse_args()
+
+class Library:
+    """Sections and their files, loaded once from the manifest."""
+
+    def __init__(self, root, extra_items):
+        with open(os.path.join(root, 'plex', 'sections.json')) as f:
+            manifest = json.load(f)
+        self.added_at = manifest['added_at']
+        self.sections = {section['key']: section for section in manifest['sections']}
+        self.files = {}
+        for key, section in self.sections.items():
+            with open(os.path.join(root, 'plex', f'{key}.txt')) as f:
+                files = f.read().splitlines()
+            files.extend(os.path.join(section['location'], 'Gone', f'Gone {i:07d}.mkv') for i in range(extra_items))
+            self.files[key] = files
+        self.lock = threading.Lock()
+        self.refreshing_until = {}  # Section key -> time it stops reporting refreshing
+        self.requests = Counter()
+        self.refreshed = []
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping idle keep-alive connections is expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+def make_handler(library, args):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def send(self, body, content_type='text/xml'):
+            data = body.encode()
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def not_found(self):
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            path = url.path.rstrip('/') or '/'
+            parts = path.split('/')
+
+            if path == '/bench/stats':
+                with library.lock:
+                    stats = {'requests': dict(library.requests), 'refreshed': len(library.refreshed)}
+                return self.send(json.dumps(stats), 'application/json')
+            if path == '/bench/reset':
+                with library.lock:
+                    library.requests.clear()
+                    library.refreshed.clear()
+                return self.send('{}', 'application/json')
+
+            endpoint = '/library/sections/{id}/' + parts[-1] if len(parts) == 5 else path
+            with library.lock:
+                library.requests[endpoint] += 1
+            if args.latency:
+                time.sleep(args.latency)
+
+            if path == '/':
+                return self.send('<MediaContainer size="0" friendlyName="Bench" machineIdentifier="bench" version="1.40.0.0" myPlex="0" platform="Linux"/>')
+            if path == '/library/sections':
+                return self.send(self.sections())
+            if len(parts) == 5 and parts[3] in library.sections:
+                if parts[4] == 'all':
+                    return self.send(self.items(parts[3], query))
+                if parts[4] == 'refresh':
+                    with library.lock:
+                        library.refreshed.append(query.get('path'))
+                        library.refreshing_until[parts[3]] = time.time() + args.refresh_time
+                    return self.send('<MediaContainer size="0"/>')
+            return self.not_found()
+
+        def sections(self):
+            now = time.time()
+            directories = []
+            for key, section in library.sections.items():
+                refreshing = '1' if library.refreshing_until.get(key, 0) > now else '0'
+                directories.append(
+                    f'<Directory key="{key}" title={quoteattr(section["title"])} type="{section["type"]}" refreshing="{refreshing}">'
+                    f'<Location id="{key}" path={quoteattr(section["location"])}/></Directory>'
+                )
+            return f'<MediaContainer size="{len(directories)}">{"".join(directories)}</MediaContainer>'
+
+        def items(self, key, query):
+            files = library.files[key]
+            # Item i was added at base + i, so incremental syncs only get the newest items
+            base = library.added_at - len(files) + 1
+            first = 0
+            for name, value in query.items():
+                if name.endswith('>>'):
+                    first = max(first, min(len(files), int(value) - base + 1))
+            total = len(files) - first
+            start = int(query.get('X-Plex-Container-Start', self.headers.get('X-Plex-Container-Start', 0)))
+            size = int(query.get('X-Plex-Container-Size', self.headers.get('X-Plex-Container-Size', total)))
+            start = first + min(start, total)
+            end = min(start + size, len(files))
+            item_type = ITEM_TYPES[library.sections[key]['type']]
+            videos = ''.join(
+                f'<Video ratingKey="{key}{i}" type="{item_type}" addedAt="{base + i}" updatedAt="{base + i}">'
+                f'<Media><Part file={quoteattr(files[i])}/></Media></Video>'
+                for i in range(start, end)
+            )
+            return f'<MediaContainer size="{end - start}" totalSize="{total}" offset="{start - first}">{videos}</MediaContainer>'
+
+    return Handler
+
+def main():
+    args = parse_args()
+    library = Library(args.root, args.extra_items)
+    server = Server(('127.0.0.1', args.port), make_handler(library, args))
+    total = sum(len(files) for files in library.files.values())
+    print(f"Serving {total} items from {args.root} on http://127.0.0.1:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    sys.exit(main())
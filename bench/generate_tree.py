@@ -0,0 +1,88 @@
+"""Generate a synthetic movie and TV tree, plus the library Plex would report for it.
+
+Files are empty, so millions of them fit on any disk. Alongside the tree a manifest
+is written for fakeplex.py: the library sections and, per section, the files Plex
+knows about. A fraction of the files can be left out of the manifest so runs find
+missing items, and a fraction replaced with broken symlinks.
+
+    python bench/generate_tree.py /tmp/bench-tree --movies 20000 --shows 2000
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import time
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate a synthetic media tree for benchmarks.")
+    parser.add_argument('root', help="Directory to create the tree in")
+    parser.add_argument('--movies', type=int, default=10000, help="Number of movie folders (default: 10000)")
+    parser.add_argument('--shows', type=int, default=1000, help="Number of TV shows (default: 1000)")
+    parser.add_argument('--seasons', type=int, default=5, help="Seasons per show (default: 5)")
+    parser.add_argument('--episodes', type=int, default=10, help="Episodes per season (default: 10)")
+    parser.add_argument('--missing', type=float, default=0.001,
+                        help="Fraction of files left out of the Plex library (default: 0.001)")
+    parser.add_argument('--broken', type=float, default=0.0,
+                        help="Fraction of files created as broken symlinks (default: 0)")
+    parser.add_argument('--seed', type=int, default=404, help="Random seed, so trees are repeatable")
+    return parser.parse_args()
+
+def create_file(path, broken):
+    if broken:
+        os.symlink(path + '.target-gone', path)
+    else:
+        os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o644))
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    root = os.path.abspath(args.root)
+    movies_root = os.path.join(root, 'movies')
+    tv_root = os.path.join(root, 'tv')
+    manifest_root = os.path.join(root, 'plex')
+    for path in (movies_root, tv_root, manifest_root):
+        os.makedirs(path, exist_ok=True)
+
+    start = time.time()
+    counts = {'files': 0, 'missing': 0, 'broken': 0}
+
+    def add(path, known):
+        broken = rng.random() < args.broken
+        create_file(path, broken)
+        counts['files'] += 1
+        if broken:
+            counts['broken'] += 1
+        elif rng.random() < args.missing:
+            counts['missing'] += 1
+        else:
+            known.write(path + '\n')
+
+    with open(os.path.join(manifest_root, '1.txt'), 'w') as known:
+        for i in range(args.movies):
+            name = f"Movie {i:07d} ({1950 + i % 75})"
+            folder = os.path.join(movies_root, name)
+            os.makedirs(folder, exist_ok=True)
+            add(os.path.join(folder, f"{name}.mkv"), known)
+
+    with open(os.path.join(manifest_root, '2.txt'), 'w') as known:
+        for i in range(args.shows):
+            show = f"Show {i:06d}"
+            for season in range(1, args.seasons + 1):
+                folder = os.path.join(tv_root, show, f"Season {season:02d}")
+                os.makedirs(folder, exist_ok=True)
+                for episode in range(1, args.episodes + 1):
+                    add(os.path.join(folder, f"{show} - S{season:02d}E{episode:02d}.mkv"), known)
+
+    sections = [
+        {'key': '1', 'title': 'Movies', 'type': 'movie', 'location': movies_root},
+        {'key': '2', 'title': 'TV Shows', 'type': 'show', 'location': tv_root},
+    ]
+    with open(os.path.join(manifest_root, 'sections.json'), 'w') as f:
+        json.dump({'sections': sections, 'added_at': int(start)}, f, indent=2)
+
+    print(f"Created {counts['files']} files ({counts['missing']} unknown to Plex, "
+          f"{counts['broken']} broken symlinks) in {time.time() - start:.1f} seconds under {root}")
+
+if __name__ == '__main__':
+    sys.exit(main())
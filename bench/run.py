@@ -0,0 +1,174 @@
+"""Run rescan against fakeplex.py and a generated tree, and report how each scenario performs.
+
+Each scenario starts its own fake Plex server, runs one scan in a fresh process and
+reports wall time, files checked per second, peak memory, the time spent in each phase
+(from rescan's run report) and the requests Plex received per endpoint.
+
+    python bench/generate_tree.py /tmp/bench-tree
+    python bench/run.py /tmp/bench-tree
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+from collections import defaultdict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+# name -> settings. 'state' scenarios share snapshots and indexes, 'fresh' ones start without them.
+SCENARIOS = {
+    'cold': {
+        'description': "First run: full library fetch and full walk",
+        'state': 'default', 'fresh': True,
+    },
+    'warm': {
+        'description': "Second run: incremental sync and unchanged directories reused",
+        'state': 'default', 'fresh': False,
+    },
+    'no-cache': {
+        'description': "Snapshot and directory index disabled",
+        'state': 'no-cache', 'fresh': True,
+        'config': {'cache': {'snapshot': 'false', 'walk_index': 'false'}},
+    },
+    'merge': {
+        'description': "Merge reconciliation with dead Plex entries",
+        'state': 'merge', 'fresh': True, 'extra_items': 1000,
+        'config': {'scan': {'reconcile': 'merge'}},
+    },
+    'slow-plex': {
+        'description': "Every Plex response delayed by 50ms",
+        'state': 'slow-plex', 'fresh': True, 'latency': 0.05,
+    },
+}
+
+DRIVER = """
+import sys
+sys.path.insert(0, {repo!r})
+import rescan
+rescan.run_scan()
+"""
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark rescan against a fake Plex server.")
+    parser.add_argument('tree', help="Tree created by generate_tree.py")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"Comma-separated scenarios to run, in order (default: {','.join(SCENARIOS)})")
+    parser.add_argument('--port', type=int, default=32410, help="Port for the fake Plex server (default: 32410)")
+    parser.add_argument('--work-dir', help="Where configs, snapshots and reports are kept (default: a temporary directory)")
+    parser.add_argument('--json', help="Also write the results to this file")
+    return parser.parse_args()
+
+def write_config(path, tree, port, state_dir, overrides):
+    sections = {
+        'logs': {'loglevel': 'ERROR', 'logfile': os.path.join(state_dir, 'rescan.log')},
+        'plex': {'server': f'http://127.0.0.1:{port}', 'token': 'bench'},
+        'scan': {'directories': f"{os.path.join(tree, 'movies')}, {os.path.join(tree, 'tv')}"},
+        'behaviour': {'max_concurrent_scans': '100000', 'max_scans_per_minute': '100000', 'symlink_check': 'true'},
+        'cache': {
+            'snapshot_path': os.path.join(state_dir, 'rescan.db'),
+            'walk_index_path': os.path.join(state_dir, 'walk.db'),
+        },
+        'notifications': {'enabled': 'false'},
+    }
+    for section, values in (overrides or {}).items():
+        sections.setdefault(section, {}).update(values)
+    with open(path, 'w') as f:
+        for section, values in sections.items():
+            f.write(f"[{section}]\n")
+            for key, value in values.items():
+                f.write(f"{key} = {value}\n")
+            f.write("\n")
+
+def start_server(tree, port, scenario):
+    command = [sys.executable, os.path.join(BENCH_DIR, 'fakeplex.py'), tree, '--port', str(port),
+               '--latency', str(scenario.get('latency', 0)), '--extra-items', str(scenario.get('extra_items', 0))]
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    server.stdout.readline()  # Ready once the library is loaded
+    return server
+
+def fetch_json(port, path):
+    with urllib.request.urlopen(f'http://127.0.0.1:{port}{path}') as response:
+        return json.load(response)
+
+def run_scenario(name, scenario, args, work_dir):
+    state_dir = os.path.join(work_dir, scenario['state'])
+    if scenario['fresh'] and os.path.isdir(state_dir):
+        shutil.rmtree(state_dir)
+    os.makedirs(state_dir, exist_ok=True)
+    config_path = os.path.join(state_dir, f'{name}.ini')
+    write_config(config_path, os.path.abspath(args.tree), args.port, state_dir, scenario.get('config'))
+
+    server = start_server(args.tree, args.port, scenario)
+    try:
+        env = dict(os.environ, RESCAN_CONFIG=config_path)
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, '-c', DRIVER.format(repo=REPO_DIR)], env=env)
+        _, status, usage = os.wait4(process.pid, 0)
+        seconds = time.perf_counter() - start
+        plex = fetch_json(args.port, '/bench/stats')
+    finally:
+        server.terminate()
+        server.wait()
+
+    with open(os.path.join(state_dir, 'rescan-report.json')) as f:
+        report = json.load(f)
+    phases = defaultdict(float)
+    for span in report['phases']:
+        phases[span['phase']] += span['seconds']
+    return {
+        'scenario': name,
+        'description': scenario['description'],
+        'exit_status': os.waitstatus_to_exitcode(status),
+        'seconds': round(seconds, 3),
+        'scanned': report['scanned'],
+        'files_per_second': round(report['scanned'] / seconds) if seconds else 0,
+        'peak_rss_mb': round(usage.ru_maxrss / 1024, 1),
+        'missing': report['missing'],
+        'dead': report['dead'],
+        'scans_triggered': report['scans_triggered'],
+        'phases': {phase: round(total, 3) for phase, total in phases.items()},
+        'plex_requests': plex['requests'],
+        'plex_bytes': sum(endpoint['bytes'] for server in report['plex_requests'].values() for endpoint in server.values()),
+    }
+
+def print_result(result):
+    print(f"\n{result['scenario']}: {result['description']}")
+    if result['exit_status']:
+        print(f"  exited with status {result['exit_status']}")
+    print(f"  {result['seconds']:.2f}s, {result['scanned']} files ({result['files_per_second']} files/s), "
+          f"peak RSS {result['peak_rss_mb']} MB")
+    print(f"  missing {result['missing']}, dead {result['dead']}, scans triggered {result['scans_triggered']}")
+    print("  phases: " + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in result['phases'].items()))
+    print("  plex requests: " + ", ".join(f"{endpoint} {count}" for endpoint, count in sorted(result['plex_requests'].items()))
+          + f" ({result['plex_bytes'] / 1048576:.1f} MB received)")
+
+def main():
+    args = parse_args()
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        print(f"Unknown scenarios: {', '.join(unknown)}")
+        return 1
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='rescan-bench-')
+    results = []
+    for name in names:
+        result = run_scenario(name, SCENARIOS[name], args, work_dir)
+        print_result(result)
+        results.append(result)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if not args.work_dir:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
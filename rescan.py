@@ -1,25 +1,62 @@
 import os
-import requests
+import sys
+import argparse
+import sqlite3
 import configparser
-import xml.etree.ElementTree as ET
+import importlib
+import subprocess
 from urllib.parse import quote
 import time
-from collections import defaultdict
-from plexapi.server import PlexServer
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict, deque, Counter
 import logging
 import json
+import bisect
+import heapq
+import tempfile
+import gzip
+import shutil
+import random
+import zlib
+import re
+import unicodedata
+from contextlib import contextmanager, asynccontextmanager, AsyncExitStack
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import errno
+import struct
+import ctypes
+import ctypes.util
 from datetime import datetime
 import schedule
-import discord
-from discord import Webhook, Embed, Color
 import asyncio
-import aiohttp
+
+class LazyModule:
+    """Stand-in for a module that is only imported when one of its attributes is first used.
+
+    Keeps heavy dependencies out of processes that never need them, like Discord
+    when notifications are off or everything but the scheduler in worker mode.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+aiohttp = LazyModule('aiohttp')
+discord = LazyModule('discord')
+ET = LazyModule('xml.etree.ElementTree')
 
 # === CONFIG ===
 
 config = configparser.ConfigParser()
-# Docker-first config path
-CONFIG_PATH = '/app/config/config.ini'
+# Docker-first config path, overridable for local runs and benchmarks
+CONFIG_PATH = os.environ.get('RESCAN_CONFIG', '/app/config/config.ini')
 if not os.path.exists(CONFIG_PATH):
     print(f"❌ config.ini not found at {CONFIG_PATH}. Please ensure it's mounted in the /app/config volume.")
     exit(1)
@@ -45,13 +82,57 @@ try:
         exit(1)
 
     LOG_LEVEL = config.get('logs', 'loglevel', fallback='INFO')
+    RUN_REPORT = config.getboolean('logs', 'run_report', fallback=True)
+    RUN_LOG = config.getboolean('logs', 'run_log', fallback=True)
+    PAGE_SIZE = config.getint('plex', 'page_size', fallback=5000)
+    if PAGE_SIZE < 1:
+        print("❌ page_size must be a positive number")
+        exit(1)
+    PLEX_CONNECTIONS = config.getint('plex', 'max_connections', fallback=8)
+    SNAPSHOT_CONCURRENCY = config.getint('plex', 'snapshot_concurrency', fallback=2)
+    if PLEX_CONNECTIONS < 1 or SNAPSHOT_CONCURRENCY < 1:
+        print("❌ max_connections and snapshot_concurrency must be positive numbers")
+        exit(1)
+    # Pacing of Plex requests, adjusted while running to how quickly Plex answers
+    PLEX_MAX_RATE = config.getfloat('plex', 'max_requests_per_second', fallback=20)
+    PLEX_MIN_RATE = config.getfloat('plex', 'min_requests_per_second', fallback=0.5)
+    PLEX_SLOW_SECONDS = config.getfloat('plex', 'slow_response', fallback=10)
+    PLEX_RETRIES = config.getint('plex', 'retries', fallback=4)
+    PLEX_RETRY_BACKOFF = config.getfloat('plex', 'retry_backoff', fallback=2)
+    if not 0 < PLEX_MIN_RATE <= PLEX_MAX_RATE or PLEX_SLOW_SECONDS <= 0:
+        print("❌ min_requests_per_second and max_requests_per_second must be positive, with min no larger than max, and slow_response must be positive")
+        exit(1)
+    if PLEX_RETRIES < 0 or PLEX_RETRY_BACKOFF < 0:
+        print("❌ retries and retry_backoff must not be negative")
+        exit(1)
     SCAN_INTERVAL = config.getint('behaviour', 'scan_interval', fallback=5)
+    MAX_CONCURRENT_SCANS = config.getint('behaviour', 'max_concurrent_scans', fallback=2)
+    MAX_SCANS_PER_MINUTE = config.getint('behaviour', 'max_scans_per_minute', fallback=30)
+    if MAX_CONCURRENT_SCANS < 1 or MAX_SCANS_PER_MINUTE < 1:
+        print("❌ max_concurrent_scans and max_scans_per_minute must be positive numbers")
+        exit(1)
+    # Seconds after which a refresh Plex still reports as running no longer holds a slot
+    SCAN_TIMEOUT = config.getint('behaviour', 'scan_timeout', fallback=600)
+    if SCAN_TIMEOUT < 1:
+        print("❌ scan_timeout must be a positive number")
+        exit(1)
+    COALESCE_DEPTH = config.getint('behaviour', 'coalesce_depth', fallback=1)
+    COALESCE_THRESHOLD = config.getint('behaviour', 'coalesce_threshold', fallback=3)
+    # Collapsing into a library location means a full scan of that library, so it is opt-in
+    COALESCE_LIBRARY_ROOT = config.getboolean('behaviour', 'coalesce_library_root', fallback=False)
     RUN_INTERVAL = config.getint('behaviour', 'run_interval', fallback=24)
     DISCORD_WEBHOOK_URL = config.get('notifications', 'discord_webhook_url', fallback='')
     DISCORD_AVATAR_URL = "https://raw.githubusercontent.com/secunit404/rescan/master/assets/logo.png"
     DISCORD_WEBHOOK_NAME = "Rescan"
     SYMLINK_CHECK = config.getboolean('behaviour', 'symlink_check', fallback=False)
+    SYMLINK_WORKERS = config.getint('behaviour', 'symlink_workers', fallback=16)
+    if SYMLINK_WORKERS < 1:
+        print("❌ symlink_workers must be a positive number")
+        exit(1)
     NOTIFICATIONS_ENABLED = config.getboolean('notifications', 'enabled', fallback=True)
+    ATTACH_RUN_LOG = config.getboolean('notifications', 'attach_run_log', fallback=True)
+    # Run each scheduled scan in a short-lived child process, so the scheduler stays small
+    SCAN_WORKER = config.getboolean('behaviour', 'scan_worker', fallback=False)
 
     # Support both comma-separated or line-separated values
     directories_raw = config.get('scan', 'directories')
@@ -61,6 +142,121 @@ try:
         print("❌ No scan directories configured. Please set directories in config.ini")
         exit(1)
 
+    WALK_WORKERS = config.getint('scan', 'walk_workers', fallback=8)
+    if WALK_WORKERS < 1:
+        print("❌ walk_workers must be a positive number")
+        exit(1)
+
+    # How files are matched against Plex: 'lookup' checks each file against a cached
+    # library, 'merge' sorts both sides and joins them in one pass
+    RECONCILE_MODE = config.get('scan', 'reconcile', fallback='lookup').strip().lower()
+    if RECONCILE_MODE not in ('lookup', 'merge'):
+        print("❌ reconcile must be either 'lookup' or 'merge'")
+        exit(1)
+    MERGE_CHUNK_SIZE = config.getint('scan', 'merge_chunk_size', fallback=200000)
+    if MERGE_CHUNK_SIZE < 1:
+        print("❌ merge_chunk_size must be a positive number")
+        exit(1)
+    # Files held per library while it is cached; the walk waits for the library beyond this
+    MAX_WAITING_FILES = config.getint('scan', 'max_waiting_files', fallback=50000)
+    if MAX_WAITING_FILES < 1:
+        print("❌ max_waiting_files must be a positive number")
+        exit(1)
+
+    # Unicode form paths are compared in, so a name Plex stores composed (NFC) still
+    # matches the same name on disk in decomposed form (NFD), and the other way around
+    UNICODE_NORMALIZATION = config.get('scan', 'unicode_normalization', fallback='NFC').strip().upper()
+    if UNICODE_NORMALIZATION not in ('NFC', 'NFD', 'NONE'):
+        print("❌ unicode_normalization must be 'NFC', 'NFD' or 'none'")
+        exit(1)
+    if UNICODE_NORMALIZATION == 'NONE':
+        UNICODE_NORMALIZATION = None
+
+    # Optional rolling mode: split the tree into stable shards and walk only some per run
+    SHARD_COUNT = config.getint('scan', 'shards', fallback=0)
+    SHARDS_PER_RUN = config.getint('scan', 'shards_per_run', fallback=1)
+    SHARD_BUDGET = config.getint('scan', 'shard_budget', fallback=0)
+    if SHARD_COUNT < 0 or SHARDS_PER_RUN < 0 or SHARD_BUDGET < 0:
+        print("❌ shards, shards_per_run and shard_budget must not be negative")
+        exit(1)
+
+    # Optional persistent snapshot of library files between runs
+    SNAPSHOT_ENABLED = config.getboolean('cache', 'snapshot', fallback=True)
+    SNAPSHOT_PATH = config.get('cache', 'snapshot_path', fallback='') or os.path.join(os.path.dirname(CONFIG_PATH), 'rescan.db')
+    FULL_RESYNC_HOURS = config.getint('cache', 'full_resync_hours', fallback=168)
+    WALK_INDEX_ENABLED = config.getboolean('cache', 'walk_index', fallback=True)
+    WALK_INDEX_PATH = config.get('cache', 'walk_index_path', fallback='') or os.path.join(os.path.dirname(CONFIG_PATH), 'walk.db')
+    SHARD_STATE_PATH = config.get('cache', 'shard_state_path', fallback='') or os.path.join(os.path.dirname(CONFIG_PATH), 'shards.json')
+    HEALTH_STATE_PATH = config.get('cache', 'health_state_path', fallback='') or os.path.join(os.path.dirname(CONFIG_PATH), 'health.json')
+
+    # Circuit breaker that stops scans for scan roots that look like a failed mount
+    HEALTH_SENTINEL = config.get('health', 'sentinel', fallback='').strip()
+    HEALTH_MIN_FILE_RATIO = config.getfloat('health', 'min_file_ratio', fallback=0.5)
+    HEALTH_MAX_MISSING_RATIO = config.getfloat('health', 'max_missing_ratio', fallback=0.5)
+    HEALTH_MIN_CHECKED = config.getint('health', 'min_checked', fallback=100)
+    if not 0 <= HEALTH_MIN_FILE_RATIO <= 1 or not 0 <= HEALTH_MAX_MISSING_RATIO <= 1 or HEALTH_MIN_CHECKED < 1:
+        print("❌ min_file_ratio and max_missing_ratio must be between 0 and 1, and min_checked must be a positive number")
+        exit(1)
+
+    # Optional watch mode checking new files as they appear between full sweeps
+    WATCH_ENABLED = config.getboolean('watch', 'enabled', fallback=False)
+    WATCH_METHOD = config.get('watch', 'method', fallback='auto').strip().lower()
+    if WATCH_METHOD not in ('auto', 'inotify', 'poll'):
+        print("❌ watch method must be 'auto', 'inotify' or 'poll'")
+        exit(1)
+    WATCH_DEBOUNCE = config.getint('watch', 'debounce', fallback=30)
+    WATCH_POLL_INTERVAL = config.getint('watch', 'poll_interval', fallback=300)
+    if WATCH_DEBOUNCE < 0 or WATCH_POLL_INTERVAL < 1:
+        print("❌ debounce must not be negative and poll_interval must be a positive number")
+        exit(1)
+
+    # Optional Prometheus-style metrics endpoint
+    METRICS_ENABLED = config.getboolean('metrics', 'enabled', fallback=False)
+    METRICS_BIND = config.get('metrics', 'bind', fallback='127.0.0.1')
+    METRICS_PORT = config.getint('metrics', 'port', fallback=9180)
+
+    def read_path_mappings(section):
+        """Parse 'local -> plex' path prefixes, comma or line separated."""
+        mappings = []
+        for mapping in config.get(section, 'path_mappings', fallback='').replace('\n', ',').split(','):
+            if not mapping.strip():
+                continue
+            local, arrow, remote = (part.strip() for part in mapping.partition('->'))
+            if not arrow or not local or not remote:
+                print(f"❌ Invalid path mapping in [{section}]: '{mapping.strip()}', expected /local/path -> /plex/path")
+                exit(1)
+            mappings.append((os.path.normpath(local), os.path.normpath(remote)))
+        return mappings
+
+    # The [plex] server, plus any [plex:name] servers sharing the same walk
+    PLEX_SERVERS = [{
+        'name': config.get('plex', 'name', fallback='Plex'),
+        'url': PLEX_URL,
+        'token': TOKEN,
+        'mappings': read_path_mappings('plex'),
+        'snapshot_path': SNAPSHOT_PATH,
+    }]
+    for section in config.sections():
+        if not section.startswith('plex:'):
+            continue
+        name = section.split(':', 1)[1].strip()
+        url = config.get(section, 'server', fallback='')
+        token = config.get(section, 'token', fallback='')
+        if not name or not url or not token:
+            print(f"❌ [{section}] needs a name after 'plex:', a server and a token")
+            exit(1)
+        if any(server['name'] == name for server in PLEX_SERVERS):
+            print(f"❌ Plex server name '{name}' is used more than once")
+            exit(1)
+        snapshot_name = 'rescan-' + re.sub(r'[^A-Za-z0-9_-]', '_', name) + '.db'
+        PLEX_SERVERS.append({
+            'name': name,
+            'url': url,
+            'token': token,
+            'mappings': read_path_mappings(section),
+            'snapshot_path': config.get(section, 'snapshot_path', fallback='') or os.path.join(os.path.dirname(CONFIG_PATH), snapshot_name),
+        })
+
 except configparser.Error as e:
     print(f"❌ Error parsing config.ini: {e}")
     exit(1)
@@ -75,24 +271,38 @@ MEDIA_EXTENSIONS = {
     '.m2v', '.m2ts', '.ts', '.vob', '.iso'
 }
 
-# Global library IDs and path mappings
-library_ids = {}
-library_paths = {}
-library_files = defaultdict(set)  # Cache of files in each library
+# Plex item types to fetch in bulk for each library type (movies, episodes, tracks)
+PLEX_ITEM_TYPES = {'movie': 1, 'show': 4, 'artist': 10}
+
+# Seconds to wait on a single Plex HTTP request
+PLEX_TIMEOUT = 120
+
+# Longest wait between retries of a Plex request, in seconds
+PLEX_MAX_BACKOFF = 60
 
-# Initialize Plex server - will be set in main()
-plex = None
+full_resync_requested = False  # Set by --full-resync, cleared after the next run
+
+# On-disk directory listing index - opened on first use
+walk_index = None
+full_walk_requested = False  # Set by --full-walk, cleared after the next run
 
 def initialize_plex():
-    """Initialize Plex server connection with error handling."""
-    global plex
-    try:
-        plex = PlexServer(PLEX_URL, TOKEN)
-        logger.info(f"✅ Connected to Plex server: {plex.friendlyName}")
-        return True
-    except Exception as e:
-        logger.error(f"❌ Failed to connect to Plex server at {PLEX_URL}: {e}")
-        return False
+    """Check that the configured Plex servers answer with their tokens.
+
+    Servers that fail are logged and skipped for now; returns False only if none answer.
+    """
+    import urllib.request  # Only needed once at startup
+    connected = 0
+    for server in servers:
+        request = urllib.request.Request(f"{server.url}/", headers={'X-Plex-Token': server.token, 'Accept': 'application/xml'})
+        try:
+            with urllib.request.urlopen(request, timeout=PLEX_TIMEOUT) as response:
+                friendly_name = ET.fromstring(response.read()).get('friendlyName')
+            logger.info(f"✅ Connected to Plex server: {friendly_name}{server.tag}")
+            connected += 1
+        except Exception as e:
+            logger.error(f"❌ Failed to connect to Plex server at {server.url}{server.tag}: {e}")
+    return connected > 0
 
 # ANSI escape codes for text formatting
 BOLD = '\033[1m'
@@ -105,10 +315,33 @@ log_handlers: list[logging.Handler] = [logging.StreamHandler()]
 LOG_FILE = config.get('logs', 'logfile', fallback=None)
 if LOG_FILE:
     try:
-        log_handlers.append(logging.FileHandler(LOG_FILE))
+        # File names that are not valid UTF-8 are logged as backslash escapes
+        log_handlers.append(logging.FileHandler(LOG_FILE, encoding='utf-8', errors='backslashreplace'))
     except (OSError, PermissionError) as e:
         print(f"Warning: Could not create log file {LOG_FILE}: {e}")
 
+# JSON report of the last run's timings and counts, written next to the log file
+RUN_REPORT_PATH = None
+if LOG_FILE and RUN_REPORT:
+    RUN_REPORT_PATH = os.path.join(os.path.dirname(LOG_FILE), 'rescan-report.json')
+
+# JSON lines log of every item the last run found, written next to the log file
+RUN_LOG_PATH = None
+if LOG_FILE and RUN_LOG:
+    RUN_LOG_PATH = os.path.join(os.path.dirname(LOG_FILE), 'rescan-run.jsonl')
+
+# JSON lines report of files that only matched Plex after Unicode normalization
+NORMALIZED_LOG_PATH = None
+if LOG_FILE and RUN_LOG:
+    NORMALIZED_LOG_PATH = os.path.join(os.path.dirname(LOG_FILE), 'rescan-normalized.jsonl')
+
+# Paths per library kept in memory for the summary; the run log has all of them
+REPORT_SAMPLE_SIZE = 10
+
+# Discord limits on a field's value and on attachments sent by webhooks
+DISCORD_FIELD_LIMIT = 1024
+DISCORD_ATTACHMENT_LIMIT = 8 * 1048576
+
 logging.basicConfig(
     level=getattr(logging, LOG_LEVEL.upper()),
     format='%(asctime)s [%(levelname)s] %(message)s',
@@ -117,35 +350,191 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+class RunLog:
+    """Append-only JSON lines log of everything a run found, written as it is found.
+
+    RunStats only keeps counts and a few sample paths in memory; the complete lists
+    of missing and dead items, broken symlinks, errors and warnings end up here.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        if path:
+            try:
+                # File names that are not valid UTF-8 are written as backslash escapes
+                self.file = open(path, 'w', encoding='utf-8', errors='backslashreplace')
+            except OSError as e:
+                logger.warning(f"Could not open run log {path}: {e}")
+                self.path = None
+
+    def write(self, kind, **fields):
+        if not self.file:
+            return
+        record = {'time': datetime.now().isoformat(timespec='seconds'), 'type': kind, **fields}
+        try:
+            self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not write to run log {self.path}, the rest of this run is not logged: {e}")
+            self.close()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def compressed(self):
+        """Gzip the log into a temporary file for attaching, or return None if it is too large."""
+        if not self.path:
+            return None
+        archive_file = tempfile.TemporaryFile()
+        try:
+            with open(self.path, 'rb') as source, gzip.GzipFile(fileobj=archive_file, mode='wb') as archive:
+                shutil.copyfileobj(source, archive)
+        except OSError as e:
+            logger.warning(f"Could not compress run log {self.path}: {e}")
+            archive_file.close()
+            return None
+        if archive_file.tell() > DISCORD_ATTACHMENT_LIMIT:
+            archive_file.close()
+            return None
+        archive_file.seek(0)
+        return archive_file
+
+def format_sample(paths, total, limit=DISCORD_FIELD_LIMIT):
+    """List sample file names under a count, as long as they fit in a Discord field."""
+    lines = []
+    size = 0
+    for path in paths:
+        line = f"• {os.path.basename(path)}"
+        if size + len(line) + 1 > limit - 40:
+            break
+        lines.append(line)
+        size += len(line) + 1
+    if total > len(lines):
+        lines.append(f"…and {total - len(lines)} more")
+    return "\n".join(lines)
+
 class RunStats:
     def __init__(self):
         self.start_time = datetime.now()
-        self.missing_items = defaultdict(list)
+        self.run_log = RunLog(RUN_LOG_PATH)
+        self.normalized_log = RunLog(NORMALIZED_LOG_PATH)
+        # Counts and the first few paths per library; every path goes to the run log
+        self.missing_counts = Counter()
+        self.dead_counts = Counter()
+        self.missing_samples = defaultdict(list)
+        self.dead_samples = defaultdict(list)
         self.errors = []
         self.warnings = []
         self.total_scanned = 0
         self.total_missing = 0
+        self.total_dead = 0
+        self.total_normalized = 0
+        self.normalized_samples = []
         self.broken_symlinks = 0
-
-    def add_missing_item(self, library_name, file_path):
-        self.missing_items[library_name].append(file_path)
+        self.dirs_unchanged = 0
+        self.dirs_listed = 0
+        self.walk_errors = Counter()  # Scan root -> walk tasks that failed
+        self.shards = defaultdict(list)  # Scan root -> shards walked under it this run, in rolling mode
+        self.suspended_roots = {}  # Scan root -> why its scans were suspended
+        self.server_totals = defaultdict(Counter)  # Server name -> missing, dead and scans
+
+    def add_missing_item(self, library_name, file_path, server=None):
+        self.missing_counts[library_name] += 1
+        if len(self.missing_samples[library_name]) < REPORT_SAMPLE_SIZE:
+            self.missing_samples[library_name].append(file_path)
         self.total_missing += 1
+        if server:
+            self.server_totals[server]['missing'] += 1
+        self.run_log.write('missing', server=server, library=library_name, path=file_path)
+
+    def add_dead_item(self, library_name, file_path, server=None):
+        self.dead_counts[library_name] += 1
+        if len(self.dead_samples[library_name]) < REPORT_SAMPLE_SIZE:
+            self.dead_samples[library_name].append(file_path)
+        self.total_dead += 1
+        if server:
+            self.server_totals[server]['dead'] += 1
+        self.run_log.write('dead', server=server, library=library_name, path=file_path)
+
+    def add_normalized_match(self, library_name, local_path, plex_path, server=None):
+        """Note a file that is in Plex under a differently normalized name."""
+        if len(self.normalized_samples) < REPORT_SAMPLE_SIZE:
+            self.normalized_samples.append(local_path)
+        self.total_normalized += 1
+        self.normalized_log.write('normalized', server=server, library=library_name, path=local_path, plex_path=plex_path)
+
+    def close_logs(self):
+        self.run_log.close()
+        self.normalized_log.close()
 
     def add_error(self, error):
         self.errors.append(error)
+        self.run_log.write('error', message=error)
 
     def add_warning(self, warning):
         self.warnings.append(warning)
+        self.run_log.write('warning', message=warning)
 
     def increment_scanned(self):
         self.total_scanned += 1
 
-    def increment_broken_symlinks(self):
+    def increment_broken_symlinks(self, file_path=None):
         self.broken_symlinks += 1
+        if file_path:
+            self.run_log.write('broken_symlink', path=file_path)
 
     def get_run_time(self):
         return datetime.now() - self.start_time
 
+    def summary_fields(self, log_attached):
+        """The (name, value, inline) fields of the Discord summary, built from counts and samples."""
+        overview = f"Found **{self.total_missing}** items from **{self.total_scanned}** scanned files"
+        if self.shards:
+            overview += f"\nWalked **{max(map(len, self.shards.values()))}** of **{SHARD_COUNT}** shards"
+        if len(servers) > 1:
+            for server in servers:
+                totals = self.server_totals[server.name]
+                overview += f"\n**{server.name}**: **{totals['missing']}** missing, **{totals['dead']}** dead, **{totals['scans']}** scans"
+        fields = [("📊 Overview", overview, False)]
+
+        if self.broken_symlinks > 0:
+            fields.append(("⚠️ Issues", f"Broken Symlinks Skipped: **{self.broken_symlinks}**", False))
+
+        if self.total_normalized:
+            value = f"Matched **{self.total_normalized}** files only after Unicode normalization"
+            value += "\n" + format_sample(self.normalized_samples, self.total_normalized)
+            if self.normalized_log.path:
+                value += f"\nListed in `{self.normalized_log.path}`"
+            fields.append(("🔤 Normalized Matches", value, False))
+
+        for library in {**self.missing_counts, **self.dead_counts}:
+            value = f"Found: **{self.missing_counts[library]}** items"
+            if self.missing_samples[library]:
+                value += "\n" + format_sample(self.missing_samples[library], self.missing_counts[library], DISCORD_FIELD_LIMIT // 2)
+            if self.dead_counts[library]:
+                value += f"\nDead: **{self.dead_counts[library]}** items"
+                value += "\n" + format_sample(self.dead_samples[library], self.dead_counts[library], DISCORD_FIELD_LIMIT // 2 - 40)
+            fields.append((f"📁 {library}", value, True))
+
+        if self.errors or self.warnings:
+            issues = [f"❌ {e}" for e in self.errors] + [f"⚠️ {w}" for w in self.warnings]
+            value = ""
+            for i, issue in enumerate(issues):
+                if len(value) + len(issue) + 1 > DISCORD_FIELD_LIMIT - 40:
+                    value += f"…and {len(issues) - i} more"
+                    break
+                value += issue + "\n"
+            fields.append(("⚠️ Other Issues", value.strip(), False))
+
+        if self.run_log.path:
+            value = f"Every item found is listed in `{self.run_log.path}`"
+            if log_attached:
+                value += ", attached"
+            fields.append(("📄 Run Log", value, False))
+        return fields
+
     async def send_discord_summary(self):
         if not NOTIFICATIONS_ENABLED:
             logger.info("📢 Notifications are disabled in config.ini")
@@ -155,156 +544,54 @@ class RunStats:
             logger.warning("Discord webhook URL not configured. Skipping notification.")
             return
 
+        log_file = self.run_log.compressed() if ATTACH_RUN_LOG else None
         try:
             # Create webhook client with aiohttp session
             async with aiohttp.ClientSession() as session:
-                webhook = Webhook.from_url(DISCORD_WEBHOOK_URL, session=session)
-
-                # Create embed
-                embed = Embed(
-                    title="Rescan Summary",
-                    color=Color.blue(),
-                    timestamp=datetime.now()
-                )
-
-                # Add overview
-                embed.add_field(
-                    name="📊 Overview",
-                    value=f"Found **{self.total_missing}** items from **{self.total_scanned}** scanned files",
-                    inline=False
-                )
-
-                # Add broken symlinks summary if any
-                if self.broken_symlinks > 0:
-                    embed.add_field(
-                        name="⚠️ Issues",
-                        value=f"Broken Symlinks Skipped: **{self.broken_symlinks}**",
-                        inline=False
-                    )
-
-                # Add library-specific stats
-                for library, items in self.missing_items.items():
-                    embed.add_field(
-                        name=f"📁 {library}",
-                        value=f"Found: **{len(items)}** items",
-                        inline=True
-                    )
-
-                # Add other errors and warnings if any
-                if self.errors or self.warnings:
-                    error_text = "\n".join([f"❌ {e}" for e in self.errors])
-                    warning_text = "\n".join([f"⚠️ {w}" for w in self.warnings])
-                    if error_text or warning_text:
-                        embed.add_field(
-                            name="⚠️ Other Issues",
-                            value=f"{error_text}\n{warning_text}",
-                            inline=False
-                        )
-
-                # Add footer
-                embed.set_footer(text=f"Run Time: {self.get_run_time()}")
-
-                # Send webhook
-                await send_discord_webhook(webhook, embed)
+                webhook = discord.Webhook.from_url(DISCORD_WEBHOOK_URL, session=session)
+                embeds = build_embeds("Rescan Summary", self.summary_fields(log_file is not None),
+                                      f"Run Time: {self.get_run_time()}")
+                attachment = discord.File(log_file, filename=os.path.basename(self.run_log.path) + '.gz') if log_file else None
+                await send_discord_webhook(webhook, embeds, attachment)
                 logger.info("✅ Discord notification sent successfully")
 
         except discord.HTTPException as e:
             logger.error(f"Discord API error: {str(e)}")
         except Exception as e:
             logger.error(f"Failed to send Discord notification: {str(e)}")
+        finally:
+            if log_file:
+                log_file.close()
+
+def build_embeds(title, fields, footer):
+    """Lay fields out over as many embeds as Discord's size limits need."""
+    embeds = []
+    embed = None
+    for name, value, inline in fields:
+        if embed is None or len(embed.fields) >= 25 or len(embed) + len(name) + len(value) + len(footer) > 6000:
+            embed = discord.Embed(
+                title=title if not embeds else f"{title} (continued)",
+                color=discord.Color.blue(),
+                timestamp=datetime.now()
+            )
+            embeds.append(embed)
+        embed.add_field(name=name, value=value, inline=inline)
+    embeds[-1].set_footer(text=footer)
+    return embeds
 
-async def send_discord_webhook(webhook, embed):
-    """Send a Discord webhook message."""
+async def send_discord_webhook(webhook, embeds, file=None):
+    """Send each embed as its own Discord webhook message, with the file attached to the first."""
     try:
-        # Check if embed exceeds Discord's limits
-        if len(str(embed)) > 6000:
-            # Split into multiple embeds
-            base_embed = Embed(
-                title=embed.title,
-                color=embed.color,
-                timestamp=embed.timestamp
-            )
-            
-            # Add overview field
-            if embed.fields and embed.fields[0].name == "📊 Overview":
-                base_embed.add_field(
-                    name=embed.fields[0].name,
-                    value=embed.fields[0].value,
-                    inline=False
-                )
-            
-            # Send base embed
-            await webhook.send(
-                embed=base_embed,
-                avatar_url=DISCORD_AVATAR_URL,
-                username=DISCORD_WEBHOOK_NAME,
-                wait=True
-            )
-            
-            # Create additional embeds for libraries
-            current_embed = Embed(
-                title="📁 Library Details",
-                color=embed.color,
-                timestamp=embed.timestamp
-            )
-            
-            # Add library fields
-            for field in embed.fields[1:]:
-                if field.name.startswith("📁"):
-                    if len(str(current_embed)) + len(str(field)) > 6000:
-                        # Send current embed and create new one
-                        await webhook.send(
-                            embed=current_embed,
-                            avatar_url=DISCORD_AVATAR_URL,
-                            username=DISCORD_WEBHOOK_NAME,
-                            wait=True
-                        )
-                        current_embed = Embed(
-                            title="📁 Library Details (continued)",
-                            color=embed.color,
-                            timestamp=embed.timestamp
-                        )
-                    current_embed.add_field(
-                        name=field.name,
-                        value=field.value,
-                        inline=field.inline
-                    )
-            
-            # Send final library embed if it has fields
-            if current_embed.fields:
-                await webhook.send(
-                    embed=current_embed,
-                    avatar_url=DISCORD_AVATAR_URL,
-                    username=DISCORD_WEBHOOK_NAME,
-                    wait=True
-                )
-            
-            # Send issues in separate embed if they exist
-            if embed.fields and embed.fields[-1].name == "⚠️ Issues":
-                issues_embed = Embed(
-                    title="⚠️ Issues",
-                    color=Color.red(),
-                    timestamp=embed.timestamp
-                )
-                issues_embed.add_field(
-                    name=embed.fields[-1].name,
-                    value=embed.fields[-1].value,
-                    inline=False
-                )
-                await webhook.send(
-                    embed=issues_embed,
-                    avatar_url=DISCORD_AVATAR_URL,
-                    username=DISCORD_WEBHOOK_NAME,
-                    wait=True
-                )
-        else:
-            # Send single embed if within limits
+        for embed in embeds:
+            extra = {'file': file} if file else {}
             await webhook.send(
                 embed=embed,
                 avatar_url=DISCORD_AVATAR_URL,
                 username=DISCORD_WEBHOOK_NAME,
-                wait=True
+                wait=True,
+                **extra
             )
+            file = None
     except discord.HTTPException as e:
         logger.error(f"Discord API error: {str(e)}")
         raise
@@ -312,215 +599,2537 @@ async def send_discord_webhook(webhook, embed):
         logger.error(f"Failed to send webhook: {str(e)}")
         raise
 
-def get_library_ids():
+class Metrics:
+    """Counters, latency histograms and phase timings, served on /metrics and written to the run report.
+
+    Counters and histograms add up over the life of the process, like Prometheus expects;
+    spans only cover the current run.
+    """
+
+    LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(float)  # (name, labels) -> value
+        self.gauges = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [count per bucket..., count above the last, sum, count]
+        self.spans = []
+        self.baseline = {}
+
+    def inc(self, name, value=1, **labels):
+        with self.lock:
+            self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(self.LATENCY_BUCKETS) + 3)
+            histogram[bisect.bisect_left(self.LATENCY_BUCKETS, value)] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def add_span(self, phase, seconds, **labels):
+        """Record how long one phase of the current run took."""
+        with self.lock:
+            self.spans.append({'phase': phase, **labels, 'seconds': round(seconds, 3)})
+        self.set('rescan_phase_seconds', seconds, phase=phase, **labels)
+
+    @contextmanager
+    def span(self, phase, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(phase, time.perf_counter() - start, **labels)
+
+    def begin_run(self):
+        """Start a new run: forget its spans and remember counters to report what this run added."""
+        with self.lock:
+            self.spans = []
+            self.baseline = dict(self.counters)
+            self.baseline.update((key, value[-2:]) for key, value in self.histograms.items())
+
+    def phase_totals(self):
+        """Total seconds per phase of the current run."""
+        totals = defaultdict(float)
+        with self.lock:
+            for span in self.spans:
+                totals[span['phase']] += span['seconds']
+        return totals
+
+    def plex_requests(self):
+        """Plex requests made during the current run, per server and endpoint."""
+        endpoints = defaultdict(lambda: defaultdict(lambda: {'requests': 0, 'errors': 0, 'seconds': 0.0, 'bytes': 0}))
+        with self.lock:
+            for (name, labels), value in self.counters.items():
+                value -= self.baseline.get((name, labels), 0)
+                if not value or name not in ('rescan_plex_requests_total', 'rescan_plex_response_bytes_total'):
+                    continue
+                label_map = dict(labels)
+                entry = endpoints[label_map['server']][label_map['endpoint']]
+                if name == 'rescan_plex_requests_total':
+                    entry['requests'] += int(value)
+                    if label_map['status'] == 'error' or int(label_map['status']) >= 400:
+                        entry['errors'] += int(value)
+                else:
+                    entry['bytes'] += int(value)
+            for (name, labels), histogram in self.histograms.items():
+                seconds = histogram[-2] - self.baseline.get((name, labels), (0, 0))[0]
+                if seconds:
+                    label_map = dict(labels)
+                    endpoints[label_map['server']][label_map['endpoint']]['seconds'] += round(seconds, 3)
+        return {server: dict(requests) for server, requests in endpoints.items()}
+
+    def export(self):
+        """Counters, gauges and histograms as JSON, for a scan worker to hand to its scheduler."""
+        with self.lock:
+            return {
+                kind: [[name, labels, value] for (name, labels), value in values.items()]
+                for kind, values in (('counters', self.counters), ('gauges', self.gauges), ('histograms', self.histograms))
+            }
+
+    def merge(self, exported):
+        """Add metrics exported by a scan worker to the ones served by this process."""
+        with self.lock:
+            for name, labels, value in exported['counters']:
+                self.counters[(name, tuple(map(tuple, labels)))] += value
+            for name, labels, value in exported['gauges']:
+                self.gauges[(name, tuple(map(tuple, labels)))] = value
+            for name, labels, values in exported['histograms']:
+                histogram = self.histograms.setdefault((name, tuple(map(tuple, labels))), [0] * (len(self.LATENCY_BUCKETS) + 3))
+                for i, value in enumerate(values):
+                    histogram[i] += value
+
+    def render(self):
+        """Format every metric in the Prometheus text exposition format."""
+        def format_labels(labels, extra=()):
+            pairs = [*labels, *extra]
+            if not pairs:
+                return ''
+            escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+            return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+        def format_value(value):
+            # Full precision: timestamps and byte counts do not fit in the six digits of :g
+            return str(value) if isinstance(value, int) else repr(float(value))
+
+        lines = []
+        with self.lock:
+            for kind, values in (('counter', self.counters), ('gauge', self.gauges)):
+                for name in sorted({name for name, _ in values}):
+                    lines.append(f"# TYPE {name} {kind}")
+                    for (metric, labels), value in sorted(values.items()):
+                        if metric == name:
+                            lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (metric, labels), histogram in sorted(self.histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip((*self.LATENCY_BUCKETS, '+Inf'), histogram):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{format_labels(labels, [('le', bound)])} {cumulative}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {format_value(histogram[-2])}")
+                    lines.append(f"{name}_count{format_labels(labels)} {histogram[-1]}")
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+
+def plex_endpoint(path):
+    """Group request paths for metrics, e.g. /library/sections/{id}/all."""
+    return re.sub(r'/\d+(?=/|$)', '/{id}', path)
+
+def plex_trace_config(server):
+    """Count every request to a Plex server and its latency up to the response headers.
+
+    Response bytes are counted where bodies are read, since streamed bodies bypass tracing.
+    """
+    trace = aiohttp.TraceConfig()
+
+    async def on_request_start(session, context, params):
+        context.start = time.perf_counter()
+
+    async def on_request_end(session, context, params):
+        endpoint = plex_endpoint(params.url.path)
+        metrics.inc('rescan_plex_requests_total', server=server, endpoint=endpoint, status=str(params.response.status))
+        metrics.observe('rescan_plex_request_seconds', time.perf_counter() - context.start, server=server, endpoint=endpoint)
+
+    async def on_request_exception(session, context, params):
+        metrics.inc('rescan_plex_requests_total', server=server, endpoint=plex_endpoint(params.url.path), status='error')
+
+    trace.on_request_start.append(on_request_start)
+    trace.on_request_end.append(on_request_end)
+    trace.on_request_exception.append(on_request_exception)
+    return trace
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serve the metrics in the Prometheus text format on /metrics."""
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = metrics.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"Metrics request: {format % args}")
+
+def start_metrics_server():
+    """Serve /metrics from a background thread, so it stays up between scheduled runs."""
+    try:
+        server = ThreadingHTTPServer((METRICS_BIND, METRICS_PORT), MetricsHandler)
+    except OSError as e:
+        logger.error(f"Could not start metrics endpoint on {METRICS_BIND}:{METRICS_PORT}: {e}")
+        return
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    logger.info(f"📈 Serving metrics on {BOLD}http://{METRICS_BIND}:{METRICS_PORT}/metrics{RESET}")
+
+def write_run_report(stats, scans_triggered):
+    """Write the timings and counts of the finished run as JSON next to the log file."""
+    if not RUN_REPORT_PATH:
+        return
+    report = {
+        'started': stats.start_time.isoformat(timespec='seconds'),
+        'seconds': round(stats.get_run_time().total_seconds(), 3),
+        'scanned': stats.total_scanned,
+        'missing': stats.total_missing,
+        'dead': stats.total_dead,
+        'broken_symlinks': stats.broken_symlinks,
+        'normalized_matches': stats.total_normalized,
+        'errors': len(stats.errors),
+        'directories_unchanged': stats.dirs_unchanged,
+        'directories_listed': stats.dirs_listed,
+        'scans_triggered': scans_triggered,
+        'servers': {
+            server.name: {key: stats.server_totals[server.name][key] for key in ('missing', 'dead', 'scans')}
+            for server in servers
+        },
+        'shards': {root: [shard + 1 for shard in shards] for root, shards in stats.shards.items()},
+        'suspended_roots': stats.suspended_roots,
+        'phases': metrics.spans,
+        'plex_requests': metrics.plex_requests(),
+        'run_log': stats.run_log.path,
+        'normalized_log': stats.normalized_log.path,
+    }
+    try:
+        temp_path = f"{RUN_REPORT_PATH}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        os.replace(temp_path, RUN_REPORT_PATH)
+        logger.debug(f"Run report written to {RUN_REPORT_PATH}")
+    except OSError as e:
+        logger.warning(f"Could not write run report to {RUN_REPORT_PATH}: {e}")
+
+def normalize_path(path):
+    """Bring a path into the configured Unicode normalization form for comparing."""
+    if not UNICODE_NORMALIZATION or path.isascii():
+        return path
+    return unicodedata.normalize(UNICODE_NORMALIZATION, path)
+
+def split_path(path):
+    """Split a path into its normalized components."""
+    return [part for part in os.path.normpath(path).split(os.sep) if part]
+
+class PathTrie:
+    """Longest-prefix index over path components."""
+
+    def __init__(self):
+        self.root = {}
+
+    def insert(self, path, value):
+        node = self.root
+        for part in split_path(path):
+            node = node.setdefault(part, {})
+        # Components are always strings, so None is free to mark a stored value
+        node[None] = value
+
+    def longest_prefix(self, path):
+        """Return the value stored at the deepest prefix of path, or None."""
+        node = self.root
+        best = node.get(None)
+        for part in split_path(path):
+            node = node.get(part)
+            if node is None:
+                break
+            if None in node:
+                best = node[None]
+        return best
+
+class Server:
+    """One Plex server, its path mappings and everything cached about its libraries.
+
+    Paths are walked under their local names; path_mappings translate local prefixes
+    to the prefixes this server sees the same files under.
+    """
+
+    def __init__(self, name, url, token, mappings, snapshot_path):
+        self.name = name
+        self.url = url
+        self.token = token
+        # Longest prefixes first, so nested mappings win over their parents
+        self.mappings = sorted(mappings, key=lambda mapping: len(mapping[0]), reverse=True)
+        self.snapshot_path = snapshot_path
+        self.snapshot = None  # On-disk library snapshot - opened on first use
+        self.library_ids = {}
+        self.library_paths = {}
+        self.library_sections = {}  # Section ID -> (title, type)
+        self.library_files = {}  # Cache of files in each library, as a PathStore per library ID
+        self.library_index = None  # Prefix index of library locations, built by get_library_ids()
+        self.library_cached_at = {}  # Library ID -> when its PathStore was last synced with Plex
+
+    @property
+    def tag(self):
+        """Suffix naming the server in log messages, only needed with several servers."""
+        return f" [{self.name}]" if len(servers) > 1 else ""
+
+    def library_label(self, library_title):
+        """Library name used in summaries, prefixed with the server when there are several."""
+        return f"{self.name}: {library_title}" if len(servers) > 1 else library_title
+
+    def _translate(self, path, reverse):
+        for local, remote in self.mappings:
+            source, target = (remote, local) if reverse else (local, remote)
+            if is_within(path, source):
+                return target + path[len(source.rstrip(os.sep)):]
+        return path
+
+    def to_plex(self, path):
+        """Translate a local path to the path this server knows it by."""
+        return self._translate(path, False)
+
+    def to_local(self, path):
+        """Translate a path reported by this server back to the local path."""
+        return self._translate(path, True)
+
+    def get_snapshot(self):
+        """Open the on-disk library snapshot if enabled."""
+        if self.snapshot is None and SNAPSHOT_ENABLED:
+            try:
+                self.snapshot = LibrarySnapshot(self.snapshot_path)
+                logger.debug(f"Using library snapshot at {self.snapshot_path}")
+            except sqlite3.Error as e:
+                logger.warning(f"Could not open library snapshot at {self.snapshot_path}, fetching full libraries: {e}")
+        return self.snapshot
+
+servers = [Server(**settings) for settings in PLEX_SERVERS]
+
+class PlexGovernor:
+    """Token bucket shared by every Plex request, with a rate that follows how Plex copes.
+
+    The rate grows by about one request per second every second while responses are
+    quick, and is halved after an error or a response slower than PLEX_SLOW_SECONDS
+    (additive increase, multiplicative decrease), staying between PLEX_MIN_RATE and
+    PLEX_MAX_RATE requests per second.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.rate = PLEX_MAX_RATE
+        self.tokens = self.rate
+        self.updated = time.monotonic()
+        self.last_decrease = 0
+        self.latency = None  # Moving average of response times
+        self.error_rate = 0.0  # Moving average of failed requests
+        metrics.set('rescan_plex_rate', self.rate, server=self.server)
+
+    async def acquire(self):
+        """Wait for a token to send one request."""
+        while True:
+            now = time.monotonic()
+            # At most one second's worth of requests can be saved up
+            self.tokens = min(max(self.rate, 1), self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def record(self, seconds, ok):
+        """Adjust the rate after a response (or failure) that took this many seconds."""
+        self.latency = seconds if self.latency is None else 0.8 * self.latency + 0.2 * seconds
+        self.error_rate = 0.9 * self.error_rate + (0.0 if ok else 0.1)
+        now = time.monotonic()
+        if ok and seconds <= PLEX_SLOW_SECONDS:
+            self.rate = min(PLEX_MAX_RATE, self.rate + 1 / self.rate)
+        elif now - self.last_decrease >= max(self.latency, 1):
+            # One burst of failures only halves the rate once
+            self.rate = max(PLEX_MIN_RATE, self.rate / 2)
+            self.last_decrease = now
+            logger.debug(f"Plex {self.server} is struggling (average response {self.latency:.2f}s, {self.error_rate:.0%} errors), slowing down to {self.rate:.1f} requests/s")
+        metrics.set('rescan_plex_rate', self.rate, server=self.server)
+
+def is_transient(error):
+    """Check whether a failed Plex request is worth retrying."""
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+class PlexClient:
+    """Pooled aiohttp session used for every request made to one Plex server during a run.
+
+    Requests are paced by a PlexGovernor per server, and transient failures are retried
+    with jittered exponential backoff.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.session = None
+        self.snapshot_slots = None
+        self.governor = None
+
+    async def __aenter__(self):
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=PLEX_CONNECTIONS),
+            timeout=aiohttp.ClientTimeout(total=PLEX_TIMEOUT),
+            headers={'X-Plex-Token': self.server.token, 'Accept': 'application/xml'},
+            trace_configs=[plex_trace_config(self.server.name)]
+        )
+        # Limits how many libraries are snapshotted at once
+        self.snapshot_slots = asyncio.Semaphore(SNAPSHOT_CONCURRENCY)
+        self.governor = PlexGovernor(self.server.name)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+
+    @asynccontextmanager
+    async def get(self, path, params=None):
+        """Send a paced GET request and yield the response; use as an async context manager.
+
+        Server errors are raised as aiohttp.ClientResponseError so they can be retried.
+        """
+        await self.governor.acquire()
+        start = time.monotonic()
+        try:
+            async with self.session.get(f"{self.server.url}{path}", params=params) as response:
+                ok = response.status < 500 and response.status != 429
+                self.governor.record(time.monotonic() - start, ok)
+                if not ok:
+                    response.raise_for_status()
+                yield response
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            self.governor.record(time.monotonic() - start, False)
+            raise
+
+    async def backoff(self, error, attempt, description):
+        """Wait before retrying a failed request, or re-raise the error if it should not be retried."""
+        if attempt >= PLEX_RETRIES or not is_transient(error):
+            raise error
+        delay = min(PLEX_MAX_BACKOFF, PLEX_RETRY_BACKOFF * 2 ** attempt) * random.uniform(0.5, 1.5)
+        retry_after = getattr(error, 'headers', None) and error.headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(PLEX_MAX_BACKOFF, int(retry_after)))
+        metrics.inc('rescan_plex_retries_total', server=self.server.name, endpoint=plex_endpoint(description))
+        logger.warning(f"Plex request to {description}{self.server.tag} failed ({error or type(error).__name__}), retrying in {delay:.1f} seconds")
+        await asyncio.sleep(delay)
+
+    async def retry(self, operation, description):
+        """Await operation(), retrying it on transient failures."""
+        attempt = 0
+        while True:
+            try:
+                return await operation()
+            except Exception as e:
+                await self.backoff(e, attempt, description)
+                attempt += 1
+
+    async def get_xml(self, path, params=None):
+        async def fetch():
+            async with self.get(path, params) as response:
+                response.raise_for_status()
+                return await response.read()
+
+        body = await self.retry(fetch, path)
+        metrics.inc('rescan_plex_response_bytes_total', len(body), server=self.server.name, endpoint=plex_endpoint(path))
+        return ET.fromstring(body)
+
+class PathStore:
+    """Compact set of file paths for one library.
+
+    Paths are split into directory and file name, so each directory is stored once
+    instead of being repeated in every path below it. Names are kept in a set per
+    directory while the store is filled, then as sorted tuples searched with bisect
+    once frozen. Paths not in the configured Unicode normalization form are also
+    indexed under their normalized form, so match() finds them from either form.
+    """
+
+    def __init__(self):
+        self.dirs = {}  # Directory -> file names in it
+        self.aliases = {}  # Normalized path -> stored path, for paths stored in another form
+        self.count = 0
+
+    def _names(self, directory):
+        """Get the editable set of names in a directory, thawing it if frozen."""
+        names = self.dirs.get(directory)
+        if names is None:
+            names = self.dirs[directory] = set()
+        elif isinstance(names, tuple):
+            names = self.dirs[directory] = set(names)
+        return names
+
+    def add(self, path):
+        directory, _, name = path.rpartition(os.sep)
+        if path not in self:
+            self._names(directory).add(name)
+            self.count += 1
+            normalized = normalize_path(path)
+            if normalized != path:
+                self.aliases[normalized] = path
+
+    def update(self, paths):
+        for path in paths:
+            self.add(path)
+
+    def discard(self, path):
+        directory, _, name = path.rpartition(os.sep)
+        if path in self:
+            names = self._names(directory)
+            names.discard(name)
+            self.count -= 1
+            if not names:
+                del self.dirs[directory]
+            normalized = normalize_path(path)
+            if self.aliases.get(normalized) == path:
+                del self.aliases[normalized]
+
+    def difference_update(self, paths):
+        for path in paths:
+            self.discard(path)
+
+    def clear(self):
+        self.dirs.clear()
+        self.aliases.clear()
+        self.count = 0
+
+    def freeze(self):
+        """Store every directory as a sorted tuple so lookups use binary search."""
+        for directory, names in self.dirs.items():
+            if isinstance(names, set):
+                self.dirs[directory] = tuple(sorted(names))
+
+    def nbytes(self):
+        """Approximate memory held by the store, in bytes."""
+        total = sys.getsizeof(self.dirs)
+        for directory, names in self.dirs.items():
+            total += sys.getsizeof(directory) + sys.getsizeof(names)
+            total += sum(sys.getsizeof(name) for name in names)
+        total += sys.getsizeof(self.aliases)
+        total += sum(sys.getsizeof(key) + sys.getsizeof(path) for key, path in self.aliases.items())
+        return total
+
+    def match(self, path):
+        """Find the stored path matching a path, allowing a different Unicode normalization.
+
+        Returns the path as stored, or None if there is no match.
+        """
+        if path in self:
+            return path
+        normalized = normalize_path(path)
+        if normalized == path:
+            return self.aliases.get(path)
+        if normalized in self:
+            return normalized
+        return self.aliases.get(normalized)
+
+    def __contains__(self, path):
+        directory, _, name = path.rpartition(os.sep)
+        names = self.dirs.get(directory)
+        if names is None:
+            return False
+        if isinstance(names, set):
+            return name in names
+        i = bisect.bisect_left(names, name)
+        return i < len(names) and names[i] == name
+
+    def __len__(self):
+        return self.count
+
+async def get_library_ids(client):
     """Fetch library section IDs and paths dynamically from Plex."""
-    global library_ids, library_paths
-    if not plex:
-        logger.error("Plex server not initialized")
-        return {}
-    for section in plex.library.sections():
-        lib_type = section.type
-        lib_key = section.key
-        lib_title = section.title
-        library_ids[lib_type] = lib_key
-        
-        # Get the path for this library
-        for location in section.locations:
-            library_paths[location] = lib_key
-            logger.debug(f"Found library '{lib_title}' (ID: {lib_key}) at path: {location}")
-
-    return library_ids
-
-def get_library_id_for_path(file_path):
-    """Get the library section ID for a given file path."""
-    # Get all library sections
-    url = f"{PLEX_URL}/library/sections"
-    params = {'X-Plex-Token': TOKEN}
-    response = requests.get(url, params=params)
-    response.raise_for_status()
-    root = ET.fromstring(response.content)
-    
-    # Find matching sections
-    matching_sections = []
+    server = client.server
+    root = await client.get_xml('/library/sections')
+
+    server.library_paths.clear()
+    server.library_sections.clear()
+    server.library_index = PathTrie()
     for section in root.findall('Directory'):
-        section_type = section.get('type')
-        section_id = section.get('key')
-        section_title = section.get('title')
+        lib_type = section.get('type')
+        lib_key = section.get('key')
+        lib_title = section.get('title')
+        server.library_ids[lib_type] = lib_key
+        server.library_sections[lib_key] = (lib_title, lib_type)
         
-        # Get all locations for this section
+        # Get the path for this library
         for location in section.findall('Location'):
-            location_path = location.get('path')
-            matching_sections.append((section_id, section_type, location_path, section_title))
-    
-    # Find best matching section (prefer more specific matches)
-    best_match = None
-    best_match_length = 0
-    
-    for section_id, section_type, location_path, section_title in matching_sections:
-        # Normalize paths for comparison
-        normalized_scan_path = os.path.normpath(file_path)
-        normalized_location = os.path.normpath(location_path)
-        
-        # Check if the file path starts with the library location
-        if normalized_scan_path.startswith(normalized_location):
-            # Use the longest matching path (most specific)
-            if len(normalized_location) > best_match_length:
-                best_match = (section_id, section_title)
-                best_match_length = len(normalized_location)
-    
-    if best_match:
-        section_id, section_title = best_match
+            location = location.get('path')
+            server.library_paths[location] = lib_key
+            server.library_index.insert(location, (lib_key, lib_title, location))
+            logger.debug(f"Found library '{lib_title}' (ID: {lib_key}) at path: {location}{server.tag}")
+
+    return server.library_ids
+
+def get_library_id_for_path(server, file_path):
+    """Get the library section ID for a given file path, as the server sees it."""
+    # The most specific library location wins when locations are nested
+    match = server.library_index.longest_prefix(file_path) if server.library_index else None
+    if match:
+        section_id, section_title, location = match
         logger.debug(f"Found best match in section: {section_title} (id: {section_id})")
         return section_id, section_title
     
-    logger.warning(f"No matching library found for path: {file_path}")
+    logger.warning(f"No matching library found for path: {file_path}{server.tag}")
     return None, None
 
-def cache_library_files(library_id):
-    """Cache all files in a library section."""
-    if library_id in library_files:
-        logger.debug(f"Using cached files for library {BOLD}{library_id}{RESET}...")
-        return  # Already cached
+class SectionItemParser:
+    """Incremental parser that pulls (rating key, part files, last change) out of a section listing."""
 
-    if not plex:
-        logger.error("Plex server not initialized")
-        return
+    def __init__(self):
+        self.parser = ET.XMLPullParser(events=('start', 'end'))
+        self.depth = 0
+        self.items = 0
+        self.rating_key = None
+        self.files = []
+        self.changed = 0
+
+    def feed(self, data):
+        """Parse a chunk of the response, returning the items it completed."""
+        self.parser.feed(data)
+        return self._read()
+
+    def close(self):
+        self.parser.close()
+        return self._read()
+
+    def _read(self):
+        done = []
+        for event, elem in self.parser.read_events():
+            if event == 'start':
+                self.depth += 1
+                if self.depth == 2:
+                    self.rating_key = elem.get('ratingKey')
+                    self.changed = max(int(elem.get('addedAt') or 0), int(elem.get('updatedAt') or 0))
+                    self.files = []
+                continue
+            self.depth -= 1
+            if elem.tag == 'Part':
+                file = elem.get('file')
+                if file:
+                    self.files.append(file)
+            elif self.depth == 1:
+                # Drop each item once read so a page never builds a full tree
+                self.items += 1
+                elem.clear()
+                done.append((self.rating_key, self.files, self.changed))
+        return done
+
+async def iter_section_items(client, library_id, section_type, filters=None):
+    """Yield (rating key, part files, last change) for every item in a section, fetched in bulk pages."""
+    path = f"/library/sections/{library_id}/all"
+    params = {'X-Plex-Container-Size': PAGE_SIZE}
+    item_type = PLEX_ITEM_TYPES.get(section_type)
+    if item_type:
+        params['type'] = item_type
+    if filters:
+        params.update(filters)
+
+    start = 0
+    while True:
+        params['X-Plex-Container-Start'] = start
+        # A failed page is fetched again from its start, skipping the items already yielded
+        yielded = 0
+        attempt = 0
+        while True:
+            parser = SectionItemParser()
+            seen = 0
+            try:
+                async with client.get(path, params) as response:
+                    response.raise_for_status()
+                    # Stream the page and only pull Part@file
+                    async for chunk in response.content.iter_chunked(65536):
+                        metrics.inc('rescan_plex_response_bytes_total', len(chunk), server=client.server.name, endpoint=plex_endpoint(path))
+                        for item in parser.feed(chunk):
+                            seen += 1
+                            if seen > yielded:
+                                yielded = seen
+                                yield item
+                for item in parser.close():
+                    seen += 1
+                    if seen > yielded:
+                        yielded = seen
+                        yield item
+                break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                await client.backoff(e, attempt, f"{path} at offset {start}")
+                attempt += 1
+
+        logger.debug(f"Fetched {parser.items} items from library {library_id} at offset {start}")
+        if parser.items < PAGE_SIZE:
+            return
+        start += parser.items
+
+async def get_section_item_count(client, library_id, section_type):
+    """Get the number of items Plex currently holds in a section."""
+    params = {'X-Plex-Container-Start': 0, 'X-Plex-Container-Size': 0}
+    item_type = PLEX_ITEM_TYPES.get(section_type)
+    if item_type:
+        params['type'] = item_type
+    root = await client.get_xml(f"/library/sections/{library_id}/all", params)
+    return int(root.get('totalSize', root.get('size', 0)))
+
+class LibrarySnapshot:
+    """On-disk copy of the media files Plex knows about, kept per library section.
+
+    Each section is written in a single transaction once all of its changes have been
+    fetched, so sections synced concurrently never see each other's partial writes. Full
+    listings are staged in a separate table page by page while they are fetched, so they
+    are never held in memory as a whole.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS sections (
+                section_id TEXT PRIMARY KEY,
+                stamp INTEGER NOT NULL,
+                synced_at REAL NOT NULL,
+                full_synced_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS items (
+                section_id TEXT NOT NULL,
+                rating_key TEXT NOT NULL,
+                file TEXT
+            );
+            CREATE INDEX IF NOT EXISTS items_by_key ON items (section_id, rating_key);
+            CREATE TABLE IF NOT EXISTS staged_items (
+                section_id TEXT NOT NULL,
+                rating_key TEXT NOT NULL,
+                file TEXT
+            );
+            CREATE INDEX IF NOT EXISTS staged_items_by_section ON staged_items (section_id);
+        """)
+
+    def get_section(self, section_id):
+        """Return (stamp, synced_at, full_synced_at) for a section, or None if never synced."""
+        return self.db.execute(
+            "SELECT stamp, synced_at, full_synced_at FROM sections WHERE section_id = ?",
+            (section_id,)
+        ).fetchone()
+
+    def get_files(self, section_id):
+        cursor = self.db.execute(
+            "SELECT file FROM items WHERE section_id = ? AND file IS NOT NULL", (section_id,)
+        )
+        return (row[0] for row in cursor)
+
+    def count_items(self, section_id):
+        return self.db.execute(
+            "SELECT COUNT(DISTINCT rating_key) FROM items WHERE section_id = ?", (section_id,)
+        ).fetchone()[0]
+
+    def stage_items(self, section_id, items):
+        """Add items of a full listing that is still being fetched, committed right away."""
+        try:
+            self.db.executemany(
+                "INSERT INTO staged_items (section_id, rating_key, file) VALUES (?, ?, ?)",
+                [(section_id, rating_key, file) for rating_key, files, _ in items for file in files or [None]]
+            )
+            self.db.commit()
+        except sqlite3.Error:
+            self.db.rollback()
+            raise
+
+    def clear_staged(self, section_id):
+        """Drop staged items of a section, such as those left by an interrupted full sync."""
+        self.db.execute("DELETE FROM staged_items WHERE section_id = ?", (section_id,))
+        self.db.commit()
+
+    def replace_section(self, section_id, stamp):
+        """Replace everything stored for a section with its staged full listing."""
+        try:
+            self.db.execute("DELETE FROM items WHERE section_id = ?", (section_id,))
+            self.db.execute(
+                "INSERT INTO items (section_id, rating_key, file) "
+                "SELECT section_id, rating_key, file FROM staged_items WHERE section_id = ?",
+                (section_id,)
+            )
+            self.db.execute("DELETE FROM staged_items WHERE section_id = ?", (section_id,))
+            self._mark_synced(section_id, stamp, full=True)
+            self.db.commit()
+        except sqlite3.Error:
+            self.db.rollback()
+            raise
+
+    def update_section(self, section_id, items, stamp, expected_count):
+        """Apply changed items to a section.
+
+        Returns False and leaves the section untouched if the result would not hold
+        expected_count items, which means items were removed from Plex.
+        """
+        try:
+            for rating_key, files, _ in items:
+                self.db.execute("DELETE FROM items WHERE section_id = ? AND rating_key = ?", (section_id, rating_key))
+                self._insert_item(section_id, rating_key, files)
+
+            stored_count = self.count_items(section_id)
+            if stored_count != expected_count:
+                logger.info(f"Library {section_id} has {expected_count} items in Plex but {stored_count} in the snapshot, resyncing")
+                self.db.rollback()
+                return False
+
+            self._mark_synced(section_id, stamp, full=False)
+            self.db.commit()
+            return True
+        except sqlite3.Error:
+            self.db.rollback()
+            raise
+
+    def _insert_item(self, section_id, rating_key, files):
+        # Items without parts still get a row so count_items matches Plex
+        self.db.executemany(
+            "INSERT INTO items (section_id, rating_key, file) VALUES (?, ?, ?)",
+            [(section_id, rating_key, file) for file in files or [None]]
+        )
+
+    def _mark_synced(self, section_id, stamp, full):
+        now = time.time()
+        previous = self.get_section(section_id)
+        full_synced_at = now if full or not previous else previous[2]
+        self.db.execute(
+            "INSERT OR REPLACE INTO sections (section_id, stamp, synced_at, full_synced_at) VALUES (?, ?, ?, ?)",
+            (section_id, stamp, now, full_synced_at)
+        )
+
+async def sync_library_full(client, library_id, section_type, files, store):
+    """Fetch every file in a section, replacing any stored snapshot."""
+    stamp = 0
+    batch = []
+    if store:
+        store.clear_staged(library_id)
+    async for item in iter_section_items(client, library_id, section_type):
+        files.update(item[1])
+        stamp = max(stamp, item[2])
+        if store:
+            # Staged a page at a time, so only the compact PathStore holds the whole section
+            batch.append(item)
+            if len(batch) >= PAGE_SIZE:
+                store.stage_items(library_id, batch)
+                batch = []
+    if store:
+        store.stage_items(library_id, batch)
+        store.replace_section(library_id, stamp)
+
+async def sync_library_delta(client, library_id, section_type, files, store, stamp):
+    """Load a section from the snapshot and apply items added or updated since it was stamped.
+
+    Returns False if the item count no longer matches Plex, meaning items were removed
+    and a full sync is needed.
+    """
+    changed = []
+    # Plex timestamps are whole seconds, so also refetch the stamp's own second
+    for field in ('addedAt', 'updatedAt'):
+        async for item in iter_section_items(client, library_id, section_type, {f'{field}>>': stamp - 1}):
+            changed.append(item)
+    plex_count = await get_section_item_count(client, library_id, section_type)
+
+    new_stamp = max([stamp] + [item[2] for item in changed])
+    if not store.update_section(library_id, changed, new_stamp, plex_count):
+        return False
 
-    try:
-        section = plex.library.sectionByID(int(library_id))
-        logger.info(f"💾 Initializing cache for library {BOLD}{section.title}{RESET}...")
-        cache_start = time.time()
-        
-        if section.type == 'show':
-            # For TV shows, get all episodes
-            for show in section.all():
-                for episode in show.episodes():
-                    for media in episode.media:
-                        for part in media.parts:
-                            if part.file:
-                                library_files[library_id].add(part.file)
+    # The snapshot now holds every item's current files, including paths shared with
+    # items that did not change
+    files.update(store.get_files(library_id))
+    logger.debug(f"Applied {len(changed)} changed items to the snapshot of library {library_id}")
+    return True
+
+def get_library_location(server, file_path):
+    """Get the library location (root folder) a path belongs to."""
+    match = server.library_index.longest_prefix(file_path) if server.library_index else None
+    return match[2] if match else None
+
+def is_within(path, folder):
+    """Check whether path is folder itself or somewhere below it."""
+    return path == folder or path.startswith(folder.rstrip(os.sep) + os.sep)
+
+def coalesce_scan_folders(folders, location):
+    """Reduce the folders to scan in one library location to a small covering set.
+
+    When more than COALESCE_THRESHOLD folders share a parent, the parent is scanned
+    instead. A folder is collapsed at most COALESCE_DEPTH levels above the folder of
+    the missing file, and never above the library location itself. Folders are only
+    collapsed into the location, which scans the whole library, with
+    COALESCE_LIBRARY_ROOT.
+    """
+    root = os.path.normpath(location)
+    levels = {os.path.normpath(folder): 0 for folder in folders}
+    changed = True
+    while changed:
+        changed = False
+        siblings = defaultdict(list)
+        for folder, level in levels.items():
+            if level < COALESCE_DEPTH and folder != root and is_within(folder, root):
+                siblings[os.path.dirname(folder)].append(folder)
+        for parent, children in siblings.items():
+            if len(children) > COALESCE_THRESHOLD and (parent != root or COALESCE_LIBRARY_ROOT):
+                level = max(levels.pop(child) for child in children) + 1
+                levels[parent] = max(levels.get(parent, 0), level)
+                changed = True
+
+    # Drop folders already covered by a scan of one of their ancestors. Sorting by
+    # components keeps every folder right after its ancestors.
+    covering = []
+    for folder in sorted(levels, key=split_path):
+        if covering and is_within(folder, covering[-1]):
+            continue
+        covering.append(folder)
+    return covering
+
+class ExternalSorter:
+    """Sort a stream of paths, spilling sorted runs to temporary files to bound memory.
+
+    At most MERGE_CHUNK_SIZE paths are held in memory; iterating merges the spilled
+    runs and the in-memory remainder back into one sorted stream.
+    """
+
+    def __init__(self):
+        self.buffer = []
+        self.runs = []
+
+    def add(self, path):
+        self.buffer.append(path)
+        if len(self.buffer) >= MERGE_CHUNK_SIZE:
+            self._spill()
+
+    def _spill(self):
+        self.buffer.sort()
+        run = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+        # JSON keeps newlines and undecodable characters in paths intact
+        run.writelines(json.dumps(path) + '\n' for path in self.buffer)
+        run.seek(0)
+        self.runs.append(run)
+        self.buffer = []
+
+    def __iter__(self):
+        self.buffer.sort()
+        streams = [(json.loads(line) for line in run) for run in self.runs]
+        streams.append(iter(self.buffer))
+        previous = None
+        for path in heapq.merge(*streams):
+            if path != previous:
+                yield path
+            previous = path
+
+    def close(self):
+        for run in self.runs:
+            run.close()
+        self.runs = []
+        self.buffer = []
+
+def merge_join(disk_paths, plex_paths):
+    """Join two sorted, duplicate-free path streams in a single pass.
+
+    Yields ('missing', path) for paths only on disk and ('dead', path) for paths only
+    in Plex.
+    """
+    disk = iter(disk_paths)
+    plex = iter(plex_paths)
+    on_disk = next(disk, None)
+    in_plex = next(plex, None)
+    while on_disk is not None or in_plex is not None:
+        if in_plex is None or (on_disk is not None and on_disk < in_plex):
+            yield 'missing', on_disk
+            on_disk = next(disk, None)
+        elif on_disk is None or in_plex < on_disk:
+            yield 'dead', in_plex
+            in_plex = next(plex, None)
         else:
-            # For movies, get all items
-            for item in section.all():
-                for media in item.media:
-                    for part in media.parts:
-                        if part.file:
-                            library_files[library_id].add(part.file)
-        
-        cache_time = time.time() - cache_start
-        logger.info(f"💾 Cache initialized for library {BOLD}{section.title}{RESET}: {BOLD}{len(library_files[library_id])}{RESET} files in {BOLD}{cache_time:.2f}{RESET} seconds")
-    except Exception as e:
-        logger.error(f"Error caching library {library_id}: {str(e)}")
-        # Clear the cache for this library if there was an error
-        if library_id in library_files:
-            del library_files[library_id]
-
-def is_in_plex(file_path):
-    """Check if a file exists in Plex by searching in the appropriate library section."""
-    # Get the library ID for this path
-    library_id, library_title = get_library_id_for_path(file_path)
-    if not library_id:
+            on_disk = next(disk, None)
+            in_plex = next(plex, None)
+
+async def sort_library_files(client, library_id, scan_roots):
+    """Fetch a library's files from Plex into an ExternalSorter, keeping only paths under the scan roots.
+
+    Scan roots are local paths; files are kept under the names Plex reports, in the
+    configured Unicode normalization form. Returns the sorter and a dict from
+    normalized path to the name Plex reports, for the paths where the two differ.
+    """
+    server = client.server
+    section_title, section_type = server.library_sections[library_id]
+    roots = PathTrie()
+    for root in scan_roots:
+        roots.insert(server.to_plex(root), True)
+
+    sorter = ExternalSorter()
+    aliases = {}
+    async with client.snapshot_slots:
+        logger.info(f"💾 Fetching files of library {BOLD}{section_title}{RESET}{server.tag} for merge...")
+        fetch_start = time.time()
+        count = 0
+        async for _, item_files, _ in iter_section_items(client, library_id, section_type):
+            for file in item_files:
+                if roots.longest_prefix(file):
+                    normalized = normalize_path(file)
+                    if normalized != file:
+                        aliases[normalized] = file
+                    sorter.add(normalized)
+                    count += 1
+        fetch_time = time.time() - fetch_start
+        metrics.add_span('snapshot', fetch_time, server=server.name, library=section_title)
+        logger.info(f"💾 Fetched {BOLD}{count}{RESET} files of library {BOLD}{section_title}{RESET}{server.tag} in {BOLD}{fetch_time:.2f}{RESET} seconds")
+    return sorter, aliases
+
+async def cache_library_files(client, library_id):
+    """Cache all files in a library section.
+
+    Returns True once the library is cached, or False if it could not be fetched.
+    """
+    server = client.server
+    if library_id in server.library_files:
+        logger.debug(f"Using cached files for library {BOLD}{library_id}{RESET}{server.tag}...")
+        return True  # Already cached
+
+    if library_id not in server.library_sections:
+        logger.error(f"Unknown library section: {library_id}{server.tag}")
         return False
 
-    # Cache library files if not already cached
-    cache_library_files(library_id)
-    
-    # Check if file exists in cached paths using exact matching
-    is_found = file_path in library_files[library_id]
-    if is_found:
-        logger.debug(f"Found in cache: {BOLD}{file_path}{RESET}")
-    return is_found
-
-def scan_folder(library_id, folder_path):
+    section_title, section_type = server.library_sections[library_id]
+    store = server.get_snapshot()
+    state = None
+    async with client.snapshot_slots:
+        try:
+            logger.info(f"💾 Initializing cache for library {BOLD}{section_title}{RESET}{server.tag}...")
+            cache_start = time.time()
+
+            files = PathStore()
+            state = store.get_section(library_id) if store else None
+            full_due = (
+                state is None
+                or full_resync_requested
+                or time.time() - state[2] >= FULL_RESYNC_HOURS * 3600
+            )
+            mode = "full"
+            if not full_due and await sync_library_delta(client, library_id, section_type, files, store, state[0]):
+                mode = "incremental"
+            else:
+                files.clear()
+                await sync_library_full(client, library_id, section_type, files, store)
+            files.freeze()
+            server.library_files[library_id] = files
+            server.library_cached_at[library_id] = time.time()
+
+            cache_time = time.time() - cache_start
+            metrics.add_span('snapshot', cache_time, server=server.name, library=section_title)
+            rate = len(files) / cache_time if cache_time > 0 else len(files)
+            logger.info(f"💾 Cache initialized for library {BOLD}{section_title}{RESET}{server.tag} ({mode}): {BOLD}{len(files)}{RESET} files in {BOLD}{cache_time:.2f}{RESET} seconds ({rate:.0f} files/s, {files.nbytes() / 1048576:.1f} MB)")
+            return True
+        except Exception as e:
+            logger.error(f"Error caching library {library_id}{server.tag}: {str(e)}")
+            if not state:
+                return False
+            # Better to check against the last good snapshot than to skip the library
+            files = PathStore()
+            files.update(store.get_files(library_id))
+            files.freeze()
+            server.library_files[library_id] = files
+            server.library_cached_at[library_id] = time.time()
+            synced = datetime.fromtimestamp(state[1]).strftime('%d %b %Y %I:%M %p')
+            logger.warning(f"⚠️ Using the snapshot of library {BOLD}{section_title}{RESET}{server.tag} from {synced} ({len(files)} files)")
+            return True
+
+def is_in_plex(server, file_path, library_id=None):
+    """Check if a file exists in Plex by searching in the appropriate library section.
+
+    The path is the one the server knows the file by, and the library must already be
+    cached with cache_library_files(). Returns the path Plex has the file under, which
+    differs from file_path when only its Unicode normalization matched, or None.
+    """
+    # Get the library ID for this path unless the caller already resolved it
+    if library_id is None:
+        library_id, library_title = get_library_id_for_path(server, file_path)
+    if not library_id or library_id not in server.library_files:
+        return None
+
+    plex_path = server.library_files[library_id].match(file_path)
+    if plex_path is not None:
+        logger.debug(f"Found in cache: {BOLD}{plex_path}{RESET}")
+    return plex_path
+
+async def scan_folder(client, library_id, folder_path):
     """Trigger a library scan for a specific folder."""
     # Ensure library_id is a string
     library_id = str(library_id)
-    encoded_path = quote(folder_path)
-    url = f"{PLEX_URL}/library/sections/{library_id}/refresh?path={encoded_path}&X-Plex-Token={TOKEN}"
-    logger.debug(f"Scan URL: {url}")
-    response = requests.get(url)
-    logger.info(f"🔎 Scan triggered for: {BOLD}{folder_path}{RESET}")
-    logger.info(f"⏳ Waiting {BOLD}{SCAN_INTERVAL}{RESET} seconds before next scan")
-    time.sleep(SCAN_INTERVAL)  # Wait between scans
-
-def is_broken_symlink(file_path):
-    """Check if a file is a broken symlink."""
-    if not os.path.islink(file_path):
+    if not folder_path.isascii():
+        try:
+            folder_path.encode('utf-8')
+        except UnicodeEncodeError:
+            raise ValueError("the folder name is not valid UTF-8, so Plex cannot be asked to scan it")
+    logger.debug(f"Scan URL: {client.server.url}/library/sections/{library_id}/refresh?path={quote(folder_path)}")
+    async def refresh():
+        async with client.get(f"/library/sections/{library_id}/refresh", {'path': folder_path}) as response:
+            response.raise_for_status()
+
+    await client.retry(refresh, f"/library/sections/{library_id}/refresh")
+    logger.info(f"🔎 Scan triggered for: {BOLD}{folder_path}{RESET}{client.server.tag}")
+
+async def get_refreshing_sections(client):
+    """Get the IDs of library sections Plex is currently scanning."""
+    root = await client.get_xml('/library/sections')
+    return {section.get('key') for section in root.findall('Directory') if section.get('refreshing') == '1'}
+
+class ScanDispatcher:
+    """Send folder scans to Plex from a background task, paced by Plex's own scan activity.
+
+    Each section gets at most MAX_CONCURRENT_SCANS refreshes that Plex has not finished
+    yet, and no more than MAX_SCANS_PER_MINUTE refreshes are sent overall. Sections with
+    no free slot are polled every SCAN_INTERVAL seconds until Plex stops refreshing them.
+    A refresh still running after SCAN_TIMEOUT seconds is counted as finished, so a long
+    library scan or a section stuck refreshing cannot hold up the run.
+    """
+
+    # A refresh sent this recently may not show up as refreshing yet
+    SETTLE_SECONDS = 2
+
+    def __init__(self, client, allow=None):
+        self.client = client
+        self.allow = allow  # Optional check a folder must still pass when its turn comes
+        self.suspended = 0  # Folders dropped because allow() refused them
+        self.queued = defaultdict(deque)  # Section ID -> folders waiting to be scanned
+        self.in_flight = defaultdict(list)  # Section ID -> send times of unfinished refreshes
+        self.recent = deque()  # Send times within the last minute, for the global cap
+        self.wakeup = asyncio.Event()
+        self.closed = False
+        self.sent = 0
+        self.last_poll = 0
+        self.task = asyncio.create_task(self._run())
+
+    def submit(self, library_id, folder_path):
+        self.queued[str(library_id)].append(folder_path)
+        self.wakeup.set()
+
+    async def close(self):
+        """Wait until every submitted folder has been sent to Plex."""
+        self.closed = True
+        self.wakeup.set()
+        await self.task
+
+    async def _sleep(self, timeout=None):
+        """Sleep until timeout or until a folder is submitted."""
+        self.wakeup.clear()
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _next_ready(self):
+        """Pop the next (section, folder) that has a free slot, or None."""
+        for library_id, folders in self.queued.items():
+            if folders and len(self.in_flight[library_id]) < MAX_CONCURRENT_SCANS:
+                return library_id, folders.popleft()
+        return None
+
+    async def _poll_plex(self):
+        """Forget in-flight refreshes of sections Plex is no longer scanning, or that timed out."""
+        self.last_poll = time.time()
+        expired = self.last_poll - SCAN_TIMEOUT
+        for library_id, sent_times in self.in_flight.items():
+            timed_out = sum(1 for t in sent_times if t <= expired)
+            if timed_out:
+                logger.warning(f"⌛ {timed_out} scans of library {library_id} still running after {SCAN_TIMEOUT} seconds{self.client.server.tag}, no longer waiting for them")
+                sent_times[:] = [t for t in sent_times if t > expired]
+        try:
+            refreshing = await get_refreshing_sections(self.client)
+        except Exception as e:
+            logger.warning(f"Could not check Plex scan activity{self.client.server.tag}: {e}")
+            return
+        settled = self.last_poll - self.SETTLE_SECONDS
+        for library_id, sent_times in self.in_flight.items():
+            if library_id not in refreshing:
+                sent_times[:] = [t for t in sent_times if t > settled]
+
+    async def _run(self):
+        while True:
+            if not any(self.queued.values()):
+                if self.closed:
+                    return
+                await self._sleep()
+                continue
+
+            # Respect the global rate cap
+            now = time.time()
+            while self.recent and self.recent[0] <= now - 60:
+                self.recent.popleft()
+            if len(self.recent) >= MAX_SCANS_PER_MINUTE:
+                await asyncio.sleep(self.recent[0] + 60 - now)
+                continue
+
+            ready = self._next_ready()
+            if ready is None:
+                # Every section with queued folders is busy, wait for Plex to catch up
+                delay = self.last_poll + max(SCAN_INTERVAL, 1) - now
+                if delay > 0:
+                    await self._sleep(delay)
+                else:
+                    logger.debug("⏳ Waiting for Plex to finish scanning before sending more")
+                    await self._poll_plex()
+                continue
+
+            library_id, folder_path = ready
+            if self.allow and not self.allow(folder_path):
+                self.suspended += 1
+                logger.debug(f"Not scanning {folder_path}{self.client.server.tag}, its scan root is suspended")
+                continue
+            try:
+                await scan_folder(self.client, library_id, folder_path)
+            except Exception as e:
+                logger.error(f"Failed to trigger scan for {folder_path}{self.client.server.tag}: {e}")
+                continue
+            sent_at = time.time()
+            self.in_flight[library_id].append(sent_at)
+            self.recent.append(sent_at)
+            self.sent += 1
+            metrics.inc('rescan_scans_triggered_total', server=self.client.server.name)
+
+class SymlinkChecker:
+    """Find symlinks whose target is missing, listing each target directory only once.
+
+    Symlink farms (e.g. *arr libraries pointing into an rclone or debrid mount) send many
+    links into the same few remote directories, so one cached listing per target directory
+    replaces a remote lookup per link. Results are cached for the life of the checker, so
+    use a new one for each run. Links of one directory are checked in parallel on a pool
+    of SYMLINK_WORKERS threads; the checker is shared by the walk threads.
+    """
+
+    # Marks a target directory that exists but could not be listed
+    UNLISTABLE = object()
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.listings = {}  # Target directory -> {name: is symlink}, None if missing, or UNLISTABLE
+        self.targets = {}  # Target path -> whether it exists
+        self.checked = 0
+        self.broken = 0
+        self.pool = ThreadPoolExecutor(max_workers=SYMLINK_WORKERS, thread_name_prefix='symlink')
+
+    def find_broken(self, link_paths):
+        """Return the given symlinks whose target does not exist."""
+        if len(link_paths) > 1:
+            results = list(self.pool.map(self.is_broken, link_paths))
+        else:
+            results = [self.is_broken(path) for path in link_paths]
+        broken = [path for path, is_broken in zip(link_paths, results) if is_broken]
+        with self.lock:
+            self.checked += len(link_paths)
+            self.broken += len(broken)
+        return broken
+
+    def is_broken(self, link_path):
+        try:
+            target = os.readlink(link_path)
+        except OSError:
+            return False  # Not a symlink
+        target = os.path.join(os.path.dirname(link_path), target)
+        if '..' in target.split(os.sep):
+            # Only the kernel can resolve .. past other symlinks correctly
+            return not os.path.exists(link_path)
+        target = os.path.normpath(target)
+
+        exists = self.targets.get(target)
+        if exists is None:
+            exists = self.targets[target] = self._exists(target)
+        return not exists
+
+    def _exists(self, target):
+        folder, name = os.path.split(target)
+        if folder not in self.listings:
+            self.listings[folder] = self._list(folder)
+        listing = self.listings[folder]
+        if listing is None:
+            return False
+        if listing is self.UNLISTABLE:
+            return os.path.exists(target)
+        if name not in listing:
+            return False
+        if listing[name]:
+            # The target is a symlink itself, so follow the rest of the chain
+            return os.path.exists(target)
+        return True
+
+    def _list(self, folder):
+        try:
+            with os.scandir(folder) as entries:
+                return {entry.name: entry.is_symlink() for entry in entries}
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        except OSError:
+            return self.UNLISTABLE
+
+    def close(self):
+        self.pool.shutdown()
+
+# Bump when the directory index layout changes so stale indexes are rebuilt
+WALK_INDEX_VERSION = 3
+
+class DirectoryIndex:
+    """On-disk record of each scanned directory's mtime and media listing from the previous run.
+
+    Directories are keyed by their path as bytes, so names that are not valid UTF-8
+    are indexed like any other.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != WALK_INDEX_VERSION:
+            self.db.execute("DROP TABLE IF EXISTS directories")
+            self.db.execute(f"PRAGMA user_version = {WALK_INDEX_VERSION}")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS directories (
+                path BLOB PRIMARY KEY,
+                mtime INTEGER NOT NULL,
+                files TEXT NOT NULL,
+                links TEXT NOT NULL,
+                subdirs TEXT NOT NULL
+            )
+        """)
+
+    def get(self, path):
+        """Return (mtime, media files, symlinked media files, subdirectories) recorded for a directory, or None."""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT mtime, files, links, subdirs FROM directories WHERE path = ?", (os.fsencode(path),)
+            ).fetchone()
+        if row:
+            return row[0], json.loads(row[1]), set(json.loads(row[2])), json.loads(row[3])
+        return None
+
+    def put(self, path, mtime, files, links, subdirs):
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO directories (path, mtime, files, links, subdirs) VALUES (?, ?, ?, ?, ?)",
+                (os.fsencode(path), mtime, json.dumps(files), json.dumps(sorted(links)), json.dumps(subdirs))
+            )
+
+    def remove_tree(self, path):
+        """Forget a directory and everything below it."""
+        prefix = os.fsencode(path.rstrip(os.sep) + os.sep)
+        with self.lock:
+            self.db.execute(
+                "DELETE FROM directories WHERE path = ? OR substr(path, 1, ?) = ?",
+                (os.fsencode(path), len(prefix), prefix)
+            )
+
+    def commit(self):
+        with self.lock:
+            self.db.commit()
+
+def get_walk_index():
+    """Open the on-disk directory index if enabled."""
+    global walk_index
+    if walk_index is None and WALK_INDEX_ENABLED:
+        try:
+            walk_index = DirectoryIndex(WALK_INDEX_PATH)
+            logger.debug(f"Using directory index at {WALK_INDEX_PATH}")
+        except sqlite3.Error as e:
+            logger.warning(f"Could not open directory index at {WALK_INDEX_PATH}, walking every directory: {e}")
+    return walk_index
+
+def is_media_name(name):
+    """Check whether a file name is a visible media file."""
+    if name.startswith('.'):
         return False
-    return not os.path.exists(os.path.realpath(file_path))
+    dot = name.rfind('.')
+    return dot >= 0 and name[dot:].lower() in MEDIA_EXTENSIONS
+
+def list_directory(path):
+    """List the media files and subdirectories of a directory, like one step of os.walk.
+
+    Returns (media files, the subset of them that are symlinks, subdirectories), using
+    the type information scandir already has instead of extra stat calls.
+    """
+    files = []
+    links = set()
+    subdirs = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            name = entry.name
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                # Symlinked directories are not followed, same as os.walk
+                if not entry.is_symlink():
+                    subdirs.append(name)
+                continue
+
+            if not is_media_name(name):
+                continue  # skip hidden/system and non-media files
+            files.append(name)
+            if entry.is_symlink():
+                links.add(name)
+    return files, links, subdirs
+
+def read_directory(path, index, full_walk):
+    """Get the listing of one directory, from the index when its mtime is unchanged.
+
+    Returns (media files, symlinked media files, subdirectories, reused), or None if the
+    directory could not be read.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        if index:
+            index.remove_tree(path)
+        return None
 
-def run_scan():
-    """Main scan logic."""
-    stats = RunStats()
-    
-    # Clear any existing cache at the start of a new scan
-    library_files.clear()
-    logger.info("Cache cleared for new scan")
-    
-    library_ids = get_library_ids()
-    MOVIE_LIBRARY_ID = library_ids.get('movie')
-    TV_LIBRARY_ID = library_ids.get('show')
+    cached = index.get(path) if index else None
+    if cached and not full_walk and cached[0] == mtime:
+        return cached[1], cached[2], cached[3], True
 
-    if not MOVIE_LIBRARY_ID or not TV_LIBRARY_ID:
-        error_msg = "Could not find both Movie and TV Show libraries."
-        logger.error(error_msg)
-        stats.add_error(error_msg)
-        asyncio.run(stats.send_discord_summary())
-        return
+    try:
+        files, links, subdirs = list_directory(path)
+    except OSError as e:
+        logger.debug(f"Could not list {path}: {e}")
+        return None
+    if index:
+        if cached:
+            for removed in set(cached[3]) - set(subdirs):
+                index.remove_tree(os.path.join(path, removed))
+        index.put(path, mtime, files, links, subdirs)
+    return files, links, subdirs, False
+
+def walk_tree(path, index, full_walk, emit, recurse=True, symlinks=None):
+    """Walk a directory tree, passing batches of (media file, is broken symlink) to emit.
+
+    Symlinked media files are checked with the SymlinkChecker symlinks, if given.
+    Stops early if emit returns False. Returns (unchanged directories, listed
+    directories, subdirectories of path).
+    """
+    unchanged = listed = 0
+    top_subdirs = []
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        listing = read_directory(current, index, full_walk)
+        if listing is None:
+            continue
+        files, links, subdirs, reused = listing
+        if reused:
+            unchanged += 1
+        else:
+            listed += 1
+
+        broken = ()
+        if symlinks and links:
+            broken = set(symlinks.find_broken([os.path.join(current, name) for name in files if name in links]))
+        batch = []
+        for name in files:
+            file_path = os.path.join(current, name)
+            batch.append((file_path, file_path in broken))
+        if batch and not emit(batch):
+            break
+
+        subdir_paths = [os.path.join(current, name) for name in subdirs]
+        if not recurse:
+            top_subdirs = subdir_paths
+            break
+        # Reversed so directories are visited in listing order, like os.walk
+        stack.extend(reversed(subdir_paths))
+    return unchanged, listed, top_subdirs
+
+async def walk_scan_paths(scan_paths, stats, index=None, full_walk=False, include=None):
+    """Yield (media file, is broken symlink) for every media file under the scan paths.
+
+    Each scan path and each of its top-level subdirectories is walked as a separate task
+    on a pool of WALK_WORKERS threads, and files are yielded as soon as they are found,
+    so the event loop keeps checking files and talking to Plex while the walk runs.
+    If include is given, only the top-level entries it accepts are walked.
+    """
+    results = queue.Queue(maxsize=1000)
+    stopped = threading.Event()
+    counts = {path: [0, 0] for path in scan_paths}
+    remaining = defaultdict(int)  # Root -> walk tasks not finished yet
+    symlinks = SymlinkChecker() if SYMLINK_CHECK else None
+
+    def put(message):
+        # Give up once the consumer has gone away instead of blocking on a full queue
+        while not stopped.is_set():
+            try:
+                results.put(message, timeout=1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def emit(batch):
+        return put(('files', batch))
+
+    def emit_top(batch):
+        # Files directly inside a scan path
+        batch = [item for item in batch if include(item[0])]
+        return not batch or emit(batch)
+
+    def run(root, path, recurse=True):
+        try:
+            top_emit = emit if recurse or include is None else emit_top
+            unchanged, listed, subdirs = walk_tree(path, index, full_walk, top_emit, recurse, symlinks)
+            put(('done', (root, unchanged, listed, subdirs)))
+        except Exception as e:
+            put(('error', (root, e)))
+
+    pool = ThreadPoolExecutor(max_workers=WALK_WORKERS, thread_name_prefix='walk')
+    try:
+        pending = 0
+        walk_start = time.perf_counter()
+        for root in scan_paths:
+            pool.submit(run, root, root, False)
+            pending += 1
+            remaining[root] += 1
+
+        while pending:
+            kind, payload = await asyncio.to_thread(results.get)
+            if kind == 'files':
+                for item in payload:
+                    yield item
+                continue
+
+            pending -= 1
+            if kind == 'error':
+                root, error = payload
+                error_msg = f"Error walking {root}: {error}"
+                logger.error(error_msg)
+                stats.add_error(error_msg)
+                stats.walk_errors[root] += 1
+            else:
+                root, unchanged, listed, subdirs = payload
+                counts[root][0] += unchanged
+                counts[root][1] += listed
+                for subdir in subdirs:
+                    if include and not include(subdir):
+                        continue
+                    pool.submit(run, root, subdir)
+                    pending += 1
+                    remaining[root] += 1
+
+            remaining[root] -= 1
+            if not remaining[root]:
+                metrics.add_span('walk', time.perf_counter() - walk_start, root=root)
+    finally:
+        stopped.set()
+        pool.shutdown(cancel_futures=True)
+        if symlinks:
+            symlinks.close()
+
+    if index:
+        index.commit()
+    if symlinks and symlinks.checked:
+        logger.info(f"🔗 Checked {BOLD}{symlinks.checked}{RESET} symlinks by listing {BOLD}{len(symlinks.listings)}{RESET} target directories, {BOLD}{symlinks.broken}{RESET} broken")
+    for root, (unchanged, listed) in counts.items():
+        stats.dirs_unchanged += unchanged
+        stats.dirs_listed += listed
+        logger.info(f"📂 Walked {BOLD}{root}{RESET}: {BOLD}{unchanged}{RESET} unchanged directories reused, {BOLD}{listed}{RESET} listed")
+
+class ShardMap:
+    """Assign paths to SHARD_COUNT stable shards by their top-level folder under a scan root."""
+
+    def __init__(self, scan_roots):
+        self.roots = PathTrie()
+        for root in scan_roots:
+            self.roots.insert(root, (root, len(split_path(root))))
+
+    def locate(self, path):
+        """Return (scan root, shard) for a path, or None if it is not below a scan root."""
+        match = self.roots.longest_prefix(path)
+        if match is None:
+            return None
+        root, depth = match
+        parts = split_path(path)
+        if len(parts) <= depth:
+            return None
+        # crc32 rather than hash(), which changes between processes. Normalized so a
+        # folder lands in the same shard however Plex and the disk spell its name
+        return root, zlib.crc32(os.fsencode(normalize_path(parts[depth]))) % SHARD_COUNT
+
+    def walked(self, path, shards):
+        """Check whether a path is in a shard walked this run, given the shards walked per scan root."""
+        located = self.locate(path)
+        return located is not None and located[1] in shards.get(located[0], ())
+
+def load_shard_positions(roots):
+    """Get the shard each scan root's next rolling run starts at."""
+    positions = dict.fromkeys(roots, 0)
+    try:
+        with open(SHARD_STATE_PATH) as f:
+            state = json.load(f)
+        if state.get('shards') == SHARD_COUNT:
+            saved = state.get('next', 0)
+            for root in roots:
+                # Older state files kept a single position for every scan root
+                positions[root] = (saved.get(root, 0) if isinstance(saved, dict) else saved) % SHARD_COUNT
+        else:
+            logger.info("🔁 Number of shards changed, starting a new cycle")
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, AttributeError, TypeError) as e:
+        logger.warning(f"Could not read shard positions from {SHARD_STATE_PATH}, starting a new cycle: {e}")
+    return positions
+
+def save_shard_positions(positions):
+    try:
+        temp_path = f"{SHARD_STATE_PATH}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({'shards': SHARD_COUNT, 'next': positions, 'updated': int(time.time())}, f)
+        os.replace(temp_path, SHARD_STATE_PATH)
+    except OSError as e:
+        logger.warning(f"Could not save shard positions to {SHARD_STATE_PATH}: {e}")
+
+async def walk_shards(scan_paths, stats, shard_map, positions, index=None, full_walk=False):
+    """Walk the next shards of the rolling cycle, yielding like walk_scan_paths.
+
+    Each scan root walks its shards one after another from its own saved position, until
+    SHARDS_PER_RUN shards are done or SHARD_BUDGET minutes have passed. Each shard walked
+    without errors is appended to stats.shards for its root. A root whose walk fails
+    stops at that shard, so its next run starts there again, while the others go on.
+    """
+    start = time.time()
+    roots = list(scan_paths)
+    for step in range(SHARD_COUNT):
+        targets = {root: (positions[root] + step) % SHARD_COUNT for root in roots}
+        numbers = ", ".join(str(shard + 1) for shard in sorted(set(targets.values())))
+        logger.info(f"🔁 Walking shard {BOLD}{numbers}{RESET} of {BOLD}{SHARD_COUNT}{RESET}")
+        errors = Counter(stats.walk_errors)
+
+        def include(path, targets=targets):
+            located = shard_map.locate(path)
+            return located is not None and targets.get(located[0]) == located[1]
+
+        async for item in walk_scan_paths(roots, stats, index, full_walk, include):
+            yield item
+        for root in list(roots):
+            if stats.walk_errors[root] > errors[root]:
+                logger.warning(f"🔁 Shard {BOLD}{targets[root] + 1}{RESET} of {root} could not be walked completely, it is walked again next run")
+                roots.remove(root)
+            else:
+                stats.shards[root].append(targets[root])
+
+        if not roots or (SHARDS_PER_RUN and step + 1 >= SHARDS_PER_RUN):
+            break
+        if SHARD_BUDGET and time.time() - start >= SHARD_BUDGET * 60:
+            logger.info(f"🔁 Time budget of {BOLD}{SHARD_BUDGET}{RESET} minutes reached after {BOLD}{step + 1}{RESET} shards")
+            break
+
+class RootHealth:
+    """Circuit breaker per scan root, so one failed mount cannot flood Plex with scans.
+
+    A root is checked before the walk (sentinel file present, not empty), after the walk
+    (file count against the previous run) and once each server has reconciled its files
+    (share of a library's files missing from that server). Once a root trips, no more
+    scans are sent for folders under it, for one server or, for problems on disk, for
+    every server.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.roots = PathTrie()
+        self.tripped = {}  # (server name or None for all, root) -> reason
+        self.file_counts = Counter()  # Root -> files walked this run
+        self.checked = Counter()  # (server name, root, library title) -> files checked
+        self.missing = Counter()  # (server name, root, library title) -> files missing
+
+    def preflight(self, roots):
+        """Return the roots that look mounted, recording why the others were left out."""
+        healthy = []
+        for root in roots:
+            reason = None
+            if HEALTH_SENTINEL and not os.path.exists(os.path.join(root, HEALTH_SENTINEL)):
+                reason = f"sentinel file {HEALTH_SENTINEL} is missing"
+            else:
+                try:
+                    with os.scandir(root) as entries:
+                        if next(entries, None) is None:
+                            reason = "it is empty"
+                except OSError as e:
+                    reason = f"it cannot be listed ({e})"
+            if reason:
+                self.trip(None, root, f"{reason}, not walking it")
+            else:
+                self.roots.insert(root, root)
+                self.file_counts[root] = 0
+                healthy.append(root)
+        return healthy
+
+    def root_of(self, path):
+        return self.roots.longest_prefix(path)
+
+    def trip(self, server, root, reason):
+        if (server, root) in self.tripped:
+            return
+        self.tripped[(server, root)] = reason
+        self.stats.suspended_roots[root if not server else f"{root} ({server})"] = reason
+        error_msg = f"Suspending scans under {root}{f' on {server}' if server else ''}: {reason}"
+        logger.error(f"🛑 {error_msg}")
+        self.stats.add_error(error_msg)
+        metrics.inc('rescan_health_trips_total', root=root)
+
+    def allows(self, server, root):
+        return (None, root) not in self.tripped and (server, root) not in self.tripped
 
-    scanned_folders = set()
+    def count_file(self, root):
+        self.file_counts[root] += 1
 
-    for SCAN_PATH in SCAN_PATHS:
-        logger.info(f"\nScanning directory: {BOLD}{SCAN_PATH}{RESET}")
+    def record_checked(self, server, root, library_title):
+        self.checked[(server, root, library_title)] += 1
 
-        if not os.path.isdir(SCAN_PATH):
-            error_msg = f"Directory not found: {SCAN_PATH}"
+    def record_missing(self, server, root, library_title):
+        self.missing[(server, root, library_title)] += 1
+
+    def check_missing_ratios(self, server):
+        """Trip the roots where too many of a library's files are missing from a server.
+
+        Called once the server has checked every walked file and before its scans are
+        sent, so a batch of new files walked early cannot decide it on its own.
+        """
+        if not HEALTH_MAX_MISSING_RATIO:
+            return
+        for (name, root, library_title), missing in self.missing.items():
+            checked = self.checked[(name, root, library_title)]
+            if name == server and checked >= HEALTH_MIN_CHECKED and missing > checked * HEALTH_MAX_MISSING_RATIO:
+                self.trip(server, root, f"{missing} of {checked} files in {library_title} are missing from Plex")
+
+    def check_file_counts(self):
+        """Compare each walked root's file count with the previous run, then remember the healthy ones.
+
+        Not used in rolling mode, where each run walks a different part of the tree.
+        """
+        try:
+            with open(HEALTH_STATE_PATH) as f:
+                previous = json.load(f).get('file_counts', {})
+        except FileNotFoundError:
+            previous = {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read previous file counts from {HEALTH_STATE_PATH}: {e}")
+            previous = {}
+
+        counts = dict(previous)
+        for root, count in self.file_counts.items():
+            expected = previous.get(root)
+            if HEALTH_MIN_FILE_RATIO and expected and count < expected * HEALTH_MIN_FILE_RATIO:
+                # Keep the last good count, so the next run is measured against it too
+                self.trip(None, root, f"only {count} files found, the previous run found {expected} (delete {HEALTH_STATE_PATH} if they were removed on purpose)")
+            elif self.allows(None, root):
+                counts[root] = count
+
+        try:
+            temp_path = f"{HEALTH_STATE_PATH}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump({'file_counts': counts, 'updated': int(time.time())}, f)
+            os.replace(temp_path, HEALTH_STATE_PATH)
+        except OSError as e:
+            logger.warning(f"Could not save file counts to {HEALTH_STATE_PATH}: {e}")
+
+class ServerScan:
+    """Reconciles the files of one walk against one Plex server.
+
+    Files are fed in under their local paths while the walk runs. Each server caches or
+    sorts its own libraries in the background and sends its scans through its own
+    ScanDispatcher, so servers never wait on each other.
+    """
+
+    def __init__(self, client, stats, scan_roots, health, shard_map=None):
+        self.client = client
+        self.server = client.server
+        self.stats = stats
+        self.health = health
+        self.shard_map = shard_map
+        self.dispatcher = ScanDispatcher(client, self.allows_scan)
+        self.scanned_folders = set()
+        self.missing_folders = defaultdict(set)  # (library ID, location) -> folders to coalesce
+        self.snapshots = {}  # Library ID -> task caching that library's files
+        self.waiting = defaultdict(list)  # Library ID -> files found before the library was cached
+        self.skipped = defaultdict(int)  # Library title -> files not checked because caching failed
+        self.disk_files = {}  # Library ID -> ExternalSorter of files on disk, in merge mode
+        self.disk_aliases = defaultdict(dict)  # Library ID -> normalized path -> path on disk, where they differ
+        self.plex_files = {}  # Library ID -> task sorting that library's files from Plex, in merge mode
+        self.reconcile_time = defaultdict(float)  # Library title -> seconds spent checking files
+        self.needed_at = {}  # Library ID -> when a file first had to wait for that library
+        self.ready_at = {}  # Library ID -> when that library finished caching
+
+        for library_id in self.overlapping_libraries(scan_roots):
+            if RECONCILE_MODE == 'merge':
+                # Fetch every library overlapping the scan roots, so Plex entries can be
+                # reported dead even when nothing of that library is left on disk
+                self.disk_files[library_id] = ExternalSorter()
+                self.plex_files[library_id] = asyncio.create_task(sort_library_files(client, library_id, scan_roots))
+            else:
+                # Cache libraries while the walk runs rather than when their first file turns up
+                self.start_snapshot(library_id)
+
+    def overlapping_libraries(self, scan_roots):
+        """IDs of the libraries with a location inside, or containing, one of the scan roots."""
+        plex_roots = [self.server.to_plex(root) for root in scan_roots]
+        library_ids = []
+        for location, library_id in self.server.library_paths.items():
+            if library_id in library_ids:
+                continue
+            if any(is_within(location, root) or is_within(root, location) for root in plex_roots):
+                library_ids.append(library_id)
+        return library_ids
+
+    def start_snapshot(self, library_id):
+        """Cache a library in the background, noting when it is ready."""
+        task = asyncio.create_task(cache_library_files(self.client, library_id))
+        task.add_done_callback(lambda _: self.ready_at.setdefault(library_id, time.perf_counter()))
+        self.snapshots[library_id] = task
+
+    def allows_scan(self, folder_path):
+        """Check that a folder, as this server knows it, is not under a suspended scan root."""
+        root = self.health.root_of(self.server.to_local(folder_path))
+        return root is None or self.health.allows(self.server.name, root)
+
+    def add_file(self, local_path, root):
+        """Check a walked file against this server, or hold it until its library is cached.
+
+        Returns the library's snapshot task when MAX_WAITING_FILES files are held for it,
+        for the caller to await before walking on, otherwise None.
+        """
+        file_path = self.server.to_plex(local_path)
+        library_id, library_title = get_library_id_for_path(self.server, file_path)
+        if not library_id:
+            return
+
+        if RECONCILE_MODE == 'merge':
+            if library_id in self.disk_files:
+                normalized = normalize_path(file_path)
+                if normalized != file_path:
+                    self.disk_aliases[library_id][normalized] = file_path
+                self.disk_files[library_id].add(normalized)
+                self.health.record_checked(self.server.name, root, library_title)
+            return
+
+        # Files are held back until their library is ready, so the walk never waits on Plex
+        if library_id not in self.snapshots:
+            self.start_snapshot(library_id)
+        if self.snapshots[library_id].done() and not self.waiting:
+            self.check_file(file_path, library_id, library_title, root)
+        else:
+            if not self.snapshots[library_id].done():
+                self.needed_at.setdefault(library_id, time.perf_counter())
+            self.waiting[library_id].append((file_path, library_title, root))
+            self.check_waiting()
+            if len(self.waiting.get(library_id, ())) >= MAX_WAITING_FILES:
+                logger.info(f"⌛ {BOLD}{MAX_WAITING_FILES}{RESET} files are waiting for library {BOLD}{library_title}{RESET}{self.server.tag}, pausing the walk until it is cached")
+                return self.snapshots[library_id]
+        return None
+
+    def check_file(self, file_path, library_id, library_title, root):
+        if not self.snapshots[library_id].result():
+            self.skipped[library_title] += 1
+            return
+        check_start = time.perf_counter()
+        self.health.record_checked(self.server.name, root, library_title)
+        plex_path = is_in_plex(self.server, file_path, library_id)
+        if plex_path is None:
+            self.report_missing(file_path, library_id, library_title, root)
+        elif plex_path != file_path:
+            self.report_normalized(file_path, plex_path, library_title)
+        self.reconcile_time[library_title] += time.perf_counter() - check_start
+
+    def check_waiting(self):
+        for library_id in [key for key in self.waiting if self.snapshots[key].done()]:
+            for file_path, library_title, root in self.waiting.pop(library_id):
+                self.check_file(file_path, library_id, library_title, root)
+
+    def report_missing(self, file_path, library_id, library_title, root=None):
+        local_path = self.server.to_local(file_path)
+        self.stats.add_missing_item(self.server.library_label(library_title), local_path, self.server.name)
+        logger.info(f"📁 Found missing item: {BOLD}{local_path}{RESET}{self.server.tag}")
+        if root is None:
+            root = self.health.root_of(local_path)
+        if root is not None:
+            self.health.record_missing(self.server.name, root, library_title)
+
+        # Determine library type and scan parent folder
+        parent_folder = os.path.dirname(file_path)
+        if COALESCE_DEPTH > 0 or HEALTH_MAX_MISSING_RATIO:
+            # Scanned once the walk is done and the missing ratios are checked, as part
+            # of the smallest covering set when coalescing
+            self.missing_folders[(library_id, get_library_location(self.server, file_path))].add(parent_folder)
+        elif parent_folder not in self.scanned_folders:
+            self.dispatcher.submit(library_id, parent_folder)
+            self.scanned_folders.add(parent_folder)
+
+    def report_normalized(self, file_path, plex_path, library_title):
+        """Note a file Plex has under a name that only matched after Unicode normalization."""
+        local_path = self.server.to_local(file_path)
+        self.stats.add_normalized_match(self.server.library_label(library_title), local_path, plex_path, self.server.name)
+        logger.debug(f"Matched after Unicode normalization: {BOLD}{local_path}{RESET}{self.server.tag}")
+
+    async def reconcile(self, broken_files):
+        """Check the files still waiting, join merge-mode libraries and queue every scan."""
+        server = self.server
+        if self.snapshots:
+            await asyncio.gather(*self.snapshots.values())
+        self.check_waiting()
+        for library_title, seconds in self.reconcile_time.items():
+            metrics.add_span('reconcile', seconds, server=server.name, library=library_title)
+        if self.needed_at:
+            waited = 0
+            for library_id, needed_at in self.needed_at.items():
+                seconds = max(0, self.ready_at.get(library_id, time.perf_counter()) - needed_at)
+                metrics.add_span('snapshot_wait', seconds, server=server.name, library=server.library_sections[library_id][0])
+                waited += seconds
+            logger.info(f"⌛ Files waited {BOLD}{waited:.2f}{RESET} seconds in total for {BOLD}{len(self.needed_at)}{RESET} library snapshots{server.tag}")
+
+        for library_id, disk_sorter in self.disk_files.items():
+            library_title = server.library_sections[library_id][0]
+            try:
+                plex_sorter, plex_aliases = await self.plex_files[library_id]
+            except Exception as e:
+                error_msg = f"Could not fetch files of {server.library_label(library_title)} from Plex: {e}"
+                logger.error(error_msg)
+                self.stats.add_error(error_msg)
+                disk_sorter.close()
+                continue
+
+            disk_aliases = self.disk_aliases.pop(library_id, {})
+            walked = {root: set(shards) for root, shards in self.stats.shards.items()}
+            plex_paths = plex_sorter
+            if self.shard_map:
+                # Only shards walked this run can be compared with the disk
+                plex_paths = (path for path in plex_sorter if self.shard_map.walked(server.to_local(path), walked))
+            unmatched = set()  # Normalized paths with another spelling that are only on one side
+            with metrics.span('reconcile', server=server.name, library=library_title):
+                for kind, key in merge_join(disk_sorter, plex_paths):
+                    if key in disk_aliases or key in plex_aliases:
+                        unmatched.add(key)
+                    if kind == 'missing':
+                        self.report_missing(disk_aliases.get(key, key), library_id, library_title)
+                        continue
+                    local_path = server.to_local(plex_aliases.get(key, key))
+                    if local_path not in broken_files:
+                        self.stats.add_dead_item(server.library_label(library_title), local_path, server.name)
+                        logger.info(f"🗑️ In Plex but not on disk: {BOLD}{local_path}{RESET}{server.tag}")
+                # Paths on both sides that were spelled differently before normalization
+                for key in disk_aliases.keys() | plex_aliases.keys():
+                    file_path = disk_aliases.get(key, key)
+                    plex_path = plex_aliases.get(key, key)
+                    if key in unmatched or file_path == plex_path:
+                        continue
+                    if self.shard_map and not self.shard_map.walked(server.to_local(key), walked):
+                        continue
+                    self.report_normalized(file_path, plex_path, library_title)
+            disk_sorter.close()
+            plex_sorter.close()
+
+        for library_title, count in self.skipped.items():
+            error_msg = f"Could not check {count} files in {server.library_label(library_title)} because the library could not be cached"
             logger.error(error_msg)
-            stats.add_error(error_msg)
+            self.stats.add_error(error_msg)
+
+        # Every walked file is checked by now, so the missing ratios are final
+        self.health.check_missing_ratios(server.name)
+        for (library_id, location), folders in self.missing_folders.items():
+            covering = coalesce_scan_folders(folders, location) if COALESCE_DEPTH > 0 else sorted(folders)
+            if len(covering) < len(folders):
+                logger.info(f"🧩 Coalesced {BOLD}{len(folders)}{RESET} folders into {BOLD}{len(covering)}{RESET} scans under {BOLD}{location}{RESET}{server.tag}")
+            for folder in covering:
+                self.dispatcher.submit(library_id, folder)
+
+    async def dispatch(self):
+        """Wait until every queued scan has been sent to Plex."""
+        server = self.server
+        logger.info(f"⏳ Waiting for queued scans to be sent to Plex{server.tag}...")
+        with metrics.span('dispatch', server=server.name):
+            await self.dispatcher.close()
+        self.stats.server_totals[server.name]['scans'] = self.dispatcher.sent
+        logger.info(f"🔎 Triggered {BOLD}{self.dispatcher.sent}{RESET} scans{server.tag}")
+        if self.dispatcher.suspended:
+            logger.warning(f"🛑 Held back {BOLD}{self.dispatcher.suspended}{RESET} scans under suspended scan roots{server.tag}")
+
+async def open_plex_clients(stack, stats):
+    """Connect to every Plex server and discover its libraries.
+
+    Returns the clients of servers that have both a movie and a TV library; problems
+    with the others are logged and added to the run's errors.
+    """
+    clients = [await stack.enter_async_context(PlexClient(server)) for server in servers]
+    results = await asyncio.gather(*(get_library_ids(client) for client in clients), return_exceptions=True)
+    usable = []
+    for client, library_ids in zip(clients, results):
+        if isinstance(library_ids, BaseException):
+            error_msg = f"Could not fetch libraries from Plex{client.server.tag}: {library_ids}"
+        elif not library_ids.get('movie') or not library_ids.get('show'):
+            error_msg = f"Could not find both Movie and TV Show libraries{client.server.tag}."
+        else:
+            usable.append(client)
             continue
+        logger.error(error_msg)
+        stats.add_error(error_msg)
+    return usable
 
-        for root, dirs, files in os.walk(SCAN_PATH):
-            for file in files:
-                if file.startswith('.'):
-                    continue  # skip hidden/system files
-
-                file_ext = os.path.splitext(file)[1].lower()
-                if file_ext not in MEDIA_EXTENSIONS:
-                    continue  # skip non-media files
-
-                file_path = os.path.join(root, file)
-                
-                # Check for broken symlinks if enabled
-                if SYMLINK_CHECK and is_broken_symlink(file_path):
-                    warning_msg = f"⏩ Skipping broken symlink: {file_path}"
-                    logger.warning(warning_msg)
-                    stats.increment_broken_symlinks()
-                    continue
+async def run_scan_async(turn=None):
+    """Main scan logic: walk the scan paths once and check the files against every Plex server.
 
-                stats.increment_scanned()
-
-                if not is_in_plex(file_path):
-                    library_id, library_title = get_library_id_for_path(file_path)
-                    if library_title:
-                        stats.add_missing_item(library_title, file_path)
-                        logger.info(f"📁 Found missing item: {BOLD}{file_path}{RESET}")
-                    
-                        # Determine library type and scan parent folder
-                        parent_folder = os.path.dirname(file_path)
-                        if parent_folder not in scanned_folders:
-                            if library_id:
-                                scan_folder(library_id, parent_folder)
-                                scanned_folders.add(parent_folder)
-                            else:
-                                warning_msg = f"Could not determine library for path: {file_path}"
-                                logger.warning(warning_msg)
-                                stats.add_warning(warning_msg)
+    In watch mode, turn is a lock held while libraries are cached and files are checked,
+    and released before waiting for the scans to be sent, so new files can be checked
+    while Plex works through a long queue.
+    """
+    global full_resync_requested, full_walk_requested
+    stats = RunStats()
+    metrics.begin_run()
+
+    async with AsyncExitStack() as stack:
+        turn_held = False
+
+        def release_turn():
+            nonlocal turn_held
+            if turn_held:
+                turn_held = False
+                turn.release()
+
+        if turn:
+            await turn.acquire()
+            turn_held = True
+            stack.callback(release_turn)
+
+        # Clear any existing cache at the start of a new scan
+        for server in servers:
+            server.library_files.clear()
+        logger.info("Cache cleared for new scan")
+
+        with metrics.span('discovery'):
+            clients = await open_plex_clients(stack, stats)
+        if not clients:
+            stats.close_logs()
+            await stats.send_discord_summary()
+            return
+
+        broken_files = set()
+
+        scan_roots = []
+        for SCAN_PATH in SCAN_PATHS:
+            logger.info(f"\nScanning directory: {BOLD}{SCAN_PATH}{RESET}")
+
+            if not os.path.isdir(SCAN_PATH):
+                error_msg = f"Directory not found: {SCAN_PATH}"
+                logger.error(error_msg)
+                stats.add_error(error_msg)
+                continue
+            scan_roots.append(SCAN_PATH)
+
+        health = RootHealth(stats)
+        scan_roots = await asyncio.to_thread(health.preflight, scan_roots)
+
+        index = get_walk_index()
+        shard_map = ShardMap(scan_roots) if SHARD_COUNT else None
+        scans = [ServerScan(client, stats, scan_roots, health, shard_map) for client in clients]
+        if shard_map:
+            # Scan directories left out this run keep their saved positions
+            positions = load_shard_positions(SCAN_PATHS)
+            walk = walk_shards(scan_roots, stats, shard_map, positions, index, full_walk_requested)
+        else:
+            walk = walk_scan_paths(scan_roots, stats, index, full_walk_requested)
+        async for file_path, broken in walk:
+            # Broken symlinks are detected by the walker when symlink_check is enabled
+            if broken:
+                warning_msg = f"⏩ Skipping broken symlink: {file_path}"
+                logger.warning(warning_msg)
+                stats.increment_broken_symlinks(file_path)
+                if RECONCILE_MODE == 'merge':
+                    broken_files.add(file_path)
+                continue
+
+            stats.increment_scanned()
+            root = health.root_of(file_path)
+            health.count_file(root)
+            for scan in scans:
+                snapshot = scan.add_file(file_path, root)
+                if snapshot is not None:
+                    # Bounds the files held in memory; the walk threads stop once their queue is full
+                    await snapshot
+                    scan.check_waiting()
+
+        if not shard_map:
+            health.check_file_counts()
+
+        # Every server finishes its libraries and sends its scans concurrently
+        await asyncio.gather(*(scan.reconcile(broken_files) for scan in scans))
+        release_turn()
+        await asyncio.gather(*(scan.dispatch() for scan in scans))
+        scans_triggered = sum(scan.dispatcher.sent for scan in scans)
+
+        if stats.shards:
+            # Saved once scans are queued, so an interrupted run walks its shards again
+            for root, shards in stats.shards.items():
+                positions[root] = (shards[-1] + 1) % SHARD_COUNT
+                logger.info(f"🔁 Walked {BOLD}{len(shards)}{RESET} of {BOLD}{SHARD_COUNT}{RESET} shards of {BOLD}{root}{RESET}, next run starts at shard {BOLD}{positions[root] + 1}{RESET}")
+            save_shard_positions(positions)
+
+    phases = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in metrics.phase_totals().items())
+    logger.info(f"⏱️ Time per phase: {phases}")
+    metrics.inc('rescan_files_scanned_total', stats.total_scanned)
+    metrics.inc('rescan_missing_items_total', stats.total_missing)
+    metrics.inc('rescan_broken_symlinks_total', stats.broken_symlinks)
+    metrics.inc('rescan_normalized_matches_total', stats.total_normalized)
+    metrics.set('rescan_last_run_seconds', stats.get_run_time().total_seconds())
+    metrics.set('rescan_last_run_timestamp_seconds', time.time())
+    stats.close_logs()
+    write_run_report(stats, scans_triggered)
+
+    # A requested full resync or walk only applies to the run it was requested for
+    full_resync_requested = False
+    full_walk_requested = False
 
     # Send the final summary to Discord
-    asyncio.run(stats.send_discord_summary())
+    await stats.send_discord_summary()
+
+def run_scan():
+    """Run a scan on its own event loop, or in a worker process when scan_worker is enabled."""
+    if SCAN_WORKER:
+        run_scan_worker()
+    else:
+        asyncio.run(run_scan_async())
+
+def run_scan_worker():
+    """Run one scan in a child process, which takes the memory the scan needed with it when it exits."""
+    global full_resync_requested, full_walk_requested
+    command = [sys.executable, os.path.abspath(__file__), '--once']
+    if full_resync_requested:
+        command.append('--full-resync')
+    if full_walk_requested:
+        command.append('--full-walk')
+
+    with tempfile.TemporaryDirectory(prefix='rescan-') as temp_dir:
+        metrics_path = os.path.join(temp_dir, 'metrics.json')
+        if METRICS_ENABLED:
+            command += ['--metrics-out', metrics_path]
+        logger.debug(f"Starting scan worker: {' '.join(command)}")
+        returncode = subprocess.run(command).returncode
+        if returncode != 0:
+            logger.error(f"❌ Scan worker exited with status {returncode}")
+            return
+        # Only a finished scan uses up the full resync or walk it was asked for
+        full_resync_requested = False
+        full_walk_requested = False
+        if METRICS_ENABLED:
+            try:
+                with open(metrics_path) as f:
+                    metrics.merge(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read metrics from the scan worker: {e}")
+
+# inotify flags from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+INOTIFY_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_ONLYDIR | IN_DONT_FOLLOW
+INOTIFY_EVENT = struct.Struct('iIII')  # wd, mask, cookie, name length
+
+# Seconds a cached library is trusted in watch mode before it is synced with Plex again
+WATCH_CACHE_TTL = 300
+
+def is_fuse_mount(path):
+    """Check whether a path is on a FUSE mount, where inotify does not see remote changes."""
+    best, fstype = '', ''
+    try:
+        with open('/proc/mounts') as mounts:
+            for line in mounts:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mount_point = fields[1].replace('\\040', ' ')
+                if is_within(path, mount_point) and len(mount_point) >= len(best):
+                    best, fstype = mount_point, fields[2]
+    except OSError:
+        return False
+    return fstype.startswith('fuse')
+
+class ChangeBuffer:
+    """Collect new files and folders per folder until that folder has been quiet for WATCH_DEBOUNCE seconds."""
+
+    def __init__(self):
+        self.pending = {}  # Folder -> [new names, new subdirectories, time of the last change]
+        self.wakeup = asyncio.Event()
+        self.sweep_requested = asyncio.Event()
+
+    def add(self, folder, name, is_dir=False):
+        # Changes inside a new folder that is still waiting to be checked are covered by it
+        parent, child = os.path.dirname(folder), os.path.basename(folder)
+        while child:
+            entry = self.pending.get(parent)
+            if entry and child in entry[1]:
+                entry[2] = time.monotonic()
+                return
+            parent, child = os.path.dirname(parent), os.path.basename(parent)
+
+        entry = self.pending.setdefault(folder, [set(), set(), 0])
+        entry[1 if is_dir else 0].add(name)
+        entry[2] = time.monotonic()
+        self.wakeup.set()
+
+    def lost(self):
+        """Changes were dropped, so only a full sweep can catch up."""
+        self.sweep_requested.set()
+
+    async def settled(self):
+        """Wait for folders that have gone quiet and return them as (folder, names, subdirectories)."""
+        while True:
+            now = time.monotonic()
+            ready = [folder for folder, entry in self.pending.items() if now - entry[2] >= WATCH_DEBOUNCE]
+            if ready:
+                return [(folder, *self.pending.pop(folder)[:2]) for folder in ready]
+
+            timeout = None
+            if self.pending:
+                timeout = min(entry[2] for entry in self.pending.values()) + WATCH_DEBOUNCE - now
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+class InotifyWatcher:
+    """Report files and folders created under the watched trees using Linux inotify."""
+
+    def __init__(self, changes):
+        self.changes = changes
+        self.watches = {}  # Watch descriptor -> directory
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.add_watch = libc.inotify_add_watch
+        self.rm_watch = libc.inotify_rm_watch
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code))
+
+    def watch_tree(self, path):
+        """Watch a directory and every directory below it. Returns the number of directories watched."""
+        added = []
+        for current, _, _ in os.walk(path):
+            wd = self.add_watch(self.fd, os.fsencode(current), INOTIFY_MASK)
+            if wd < 0:
+                code = ctypes.get_errno()
+                if code == errno.ENOSPC:
+                    # Out of watches: undo this tree so it can be polled instead
+                    for added_wd in added:
+                        self.rm_watch(self.fd, added_wd)
+                        self.watches.pop(added_wd, None)
+                    raise OSError(code, "inotify watch limit reached, raise fs.inotify.max_user_watches")
+                continue  # Removed or unreadable since it was listed
+            self.watches[wd] = current
+            added.append(wd)
+        return len(added)
+
+    def start(self):
+        asyncio.get_running_loop().add_reader(self.fd, self._read)
+
+    def close(self):
+        asyncio.get_running_loop().remove_reader(self.fd)
+        os.close(self.fd)
+
+    def _read(self):
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + INOTIFY_EVENT.size <= len(data):
+            wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("⚠️ inotify queue overflowed, running a full sweep to catch up")
+                self.changes.lost()
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            folder = self.watches.get(wd)
+            if folder is None or not name:
+                continue
+
+            if mask & IN_ISDIR:
+                try:
+                    self.watch_tree(os.path.join(folder, name))
+                except OSError as e:
+                    logger.warning(f"Could not watch {os.path.join(folder, name)}: {e}")
+                    self.changes.lost()
+                self.changes.add(folder, name, is_dir=True)
+            else:
+                self.changes.add(folder, name)
+
+class PollingWatcher:
+    """Report files and folders created under the watched trees by polling every WATCH_POLL_INTERVAL seconds.
+
+    Only directories whose mtime changed are listed again, so polling an unchanged tree
+    costs one stat per directory.
+    """
+
+    def __init__(self, changes):
+        self.changes = changes
+        self.roots = []
+        self.listings = {}  # Directory -> (mtime, media files, subdirectories)
+
+    def watch_tree(self, path):
+        """Record the current state of a tree. Returns the number of directories found."""
+        self.roots.append(path)
+        self._poll(path, report=False)
+        return sum(1 for directory in self.listings if is_within(directory, path))
+
+    def _forget(self, path):
+        for directory in [d for d in self.listings if is_within(d, path)]:
+            del self.listings[directory]
+
+    def _poll(self, path, report=True):
+        """Return (folder, name, is directory) for everything created under path since the last poll."""
+        found = []
+        stack = [(path, report)]
+        while stack:
+            current, report_new = stack.pop()
+            try:
+                mtime = os.stat(current).st_mtime_ns
+            except OSError:
+                self._forget(current)
+                continue
+
+            previous = self.listings.get(current)
+            if previous and previous[0] == mtime:
+                stack.extend((os.path.join(current, name), report_new) for name in previous[2])
+                continue
+
+            try:
+                files, _, subdirs = list_directory(current)
+            except OSError as e:
+                logger.debug(f"Could not list {current}: {e}")
+                continue
+            self.listings[current] = (mtime, frozenset(files), tuple(subdirs))
+
+            if previous and report_new:
+                found.extend((current, name, False) for name in files if name not in previous[1])
+            if previous:
+                for name in set(previous[2]) - set(subdirs):
+                    self._forget(os.path.join(current, name))
+            for name in subdirs:
+                # A new folder is reported as a whole, its contents are only recorded
+                is_new = previous is not None and name not in previous[2]
+                if is_new and report_new:
+                    found.append((current, name, True))
+                stack.append((os.path.join(current, name), report_new and not is_new))
+        return found
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(WATCH_POLL_INTERVAL)
+            for root in self.roots:
+                for folder, name, is_dir in await asyncio.to_thread(self._poll, root):
+                    self.changes.add(folder, name, is_dir)
+
+async def start_watchers(changes):
+    """Watch every scan path with inotify, or by polling where inotify cannot be used.
+
+    Returns (inotify watcher, polling watcher), either of which may be None.
+    """
+    inotify = poller = None
+    for root in SCAN_PATHS:
+        if not os.path.isdir(root):
+            logger.error(f"Directory not found, not watching: {root}")
+            continue
+
+        if WATCH_METHOD == 'inotify' or (WATCH_METHOD == 'auto' and not is_fuse_mount(root)):
+            try:
+                if inotify is None:
+                    inotify = InotifyWatcher(changes)
+                count = await asyncio.to_thread(inotify.watch_tree, root)
+                logger.info(f"👀 Watching {BOLD}{root}{RESET} with inotify ({BOLD}{count}{RESET} directories)")
+                continue
+            except (OSError, AttributeError) as e:
+                logger.warning(f"inotify is unavailable for {root}, polling instead: {e}")
+
+        if poller is None:
+            poller = PollingWatcher(changes)
+        count = await asyncio.to_thread(poller.watch_tree, root)
+        logger.info(f"👀 Polling {BOLD}{root}{RESET} every {BOLD}{WATCH_POLL_INTERVAL}{RESET} seconds ({BOLD}{count}{RESET} directories)")
+
+    if inotify:
+        inotify.start()
+    return inotify, poller
+
+def collect_new_files(batches):
+    """List the media files behind a set of settled changes as (file path, is broken symlink)."""
+    found = {}
+    symlinks = SymlinkChecker() if SYMLINK_CHECK else None
+
+    def emit(batch):
+        found.update(batch)
+        return True
+
+    try:
+        for folder, names, subdirs in batches:
+            for name in names:
+                file_path = os.path.join(folder, name)
+                if not is_media_name(name) or not os.path.lexists(file_path):
+                    continue  # Not media, or already renamed or removed again
+                found[file_path] = bool(symlinks and symlinks.find_broken([file_path]))
+            for name in subdirs:
+                walk_tree(os.path.join(folder, name), None, True, emit, symlinks=symlinks)
+    finally:
+        if symlinks:
+            symlinks.close()
+    return found.items()
+
+async def check_new_files(targets, batches):
+    """Check newly created media files against every Plex server and queue scans for the missing ones.
+
+    targets holds a (client, dispatcher) pair per server.
+    """
+    new_files = []
+    for file_path, broken in await asyncio.to_thread(collect_new_files, batches):
+        if broken:
+            logger.warning(f"⏩ Skipping broken symlink: {file_path}")
+        else:
+            new_files.append(file_path)
+
+    for client, dispatcher in targets:
+        server = client.server
+        if server.library_index is None:
+            # Libraries not discovered yet because the server could not be reached
+            continue
+        missing_folders = defaultdict(set)  # (library ID, location) -> folders to coalesce
+        for local_path in new_files:
+            file_path = server.to_plex(local_path)
+            library_id, library_title = get_library_id_for_path(server, file_path)
+            if not library_id:
+                continue
+
+            # Plex may have picked up files since the library was cached, so resync stale caches
+            if time.time() - server.library_cached_at.get(library_id, 0) >= WATCH_CACHE_TTL:
+                server.library_files.pop(library_id, None)
+            if not await cache_library_files(client, library_id):
+                logger.error(f"Could not check {local_path} because {server.library_label(library_title)} could not be cached")
+                continue
+
+            if is_in_plex(server, file_path, library_id) is None:
+                logger.info(f"📁 Found missing item: {BOLD}{local_path}{RESET}{server.tag}")
+                missing_folders[(library_id, get_library_location(server, file_path))].add(os.path.dirname(file_path))
+
+        for (library_id, location), folders in missing_folders.items():
+            for folder in coalesce_scan_folders(folders, location) if COALESCE_DEPTH > 0 else folders:
+                dispatcher.submit(library_id, folder)
+
+async def watch_async():
+    """Run a full sweep every RUN_INTERVAL hours and check new files as they appear in between."""
+    changes = ChangeBuffer()
+    # Sweeps and checks of new files take turns, since both rebuild the library caches.
+    # A sweep gives up its turn once its files are checked, before its scans are sent.
+    turn = asyncio.Lock()
+
+    async def sweep():
+        while True:
+            await run_scan_async(turn)
+            changes.sweep_requested.clear()
+            try:
+                await asyncio.wait_for(changes.sweep_requested.wait(), RUN_INTERVAL * 3600)
+            except asyncio.TimeoutError:
+                pass
+
+    async def check():
+        while True:
+            batches = await changes.settled()
+            async with turn:
+                await check_new_files(targets, batches)
+
+    async with AsyncExitStack() as stack:
+        clients = [await stack.enter_async_context(PlexClient(server)) for server in servers]
+        results = await asyncio.gather(*(get_library_ids(client) for client in clients), return_exceptions=True)
+        for client, result in zip(clients, results):
+            if isinstance(result, BaseException):
+                # Sweeps rediscover libraries, so the server is checked again once it answers
+                logger.error(f"Could not fetch libraries from Plex{client.server.tag}, skipping it until the next sweep: {result}")
+        inotify, poller = await start_watchers(changes)
+        targets = [(client, ScanDispatcher(client)) for client in clients]
+        tasks = [asyncio.create_task(sweep()), asyncio.create_task(check())]
+        if poller:
+            tasks.append(asyncio.create_task(poller.run()))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks + [dispatcher.task for _, dispatcher in targets]:
+                task.cancel()
+            if inotify:
+                inotify.close()
+
+def process_uptime():
+    """Seconds since this process started, interpreter startup included, or None if unknown."""
+    try:
+        with open('/proc/self/stat') as f:
+            # starttime is the 22nd field, counted in clock ticks since boot
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+def resident_memory():
+    """Resident memory of this process in bytes, or None if unknown."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+def log_resident_memory(message):
+    """Log the current resident memory with a message, and publish it as a metric."""
+    rss = resident_memory()
+    if rss is not None:
+        metrics.set('rescan_resident_bytes', rss)
+        logger.info(f"{message}, using {BOLD}{rss / 1048576:.1f}{RESET} MB")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Scan media folders for files missing from Plex.")
+    parser.add_argument('--full-resync', action='store_true',
+                        help="Ignore the library snapshot and refetch every library on the first run")
+    parser.add_argument('--full-walk', action='store_true',
+                        help="Ignore the directory index and list every directory on the first run")
+    parser.add_argument('--once', action='store_true',
+                        help="Run a single scan and exit, without scheduling or watching")
+    parser.add_argument('--metrics-out', help=argparse.SUPPRESS)  # Used by scan workers
+    return parser.parse_args()
 
 def main():
     """Main function to run the scanner on a schedule."""
+    global full_resync_requested, full_walk_requested
+    args = parse_args()
+    full_resync_requested = args.full_resync
+    full_walk_requested = args.full_walk
+
+    if args.once:
+        asyncio.run(run_scan_async())
+        if args.metrics_out:
+            with open(args.metrics_out, 'w') as f:
+                json.dump(metrics.export(), f)
+        return
+
     logger.info("Starting Plex Missing Files Scanner")
 
     # Initialize Plex connection
@@ -528,13 +3137,31 @@ def main():
         logger.error("Failed to initialize Plex connection. Exiting.")
         exit(1)
 
+    startup_seconds = process_uptime()
+    if startup_seconds is not None:
+        metrics.set('rescan_startup_seconds', startup_seconds)
+        logger.info(f"🚀 Started in {BOLD}{startup_seconds:.2f}{RESET} seconds")
+
     logger.info(f"Will run every {BOLD}{RUN_INTERVAL}{RESET} hours")
 
+    if METRICS_ENABLED:
+        start_metrics_server()
+
+    if WATCH_ENABLED:
+        # Sweeps are scheduled by the watcher's own event loop
+        logger.info(f"👀 Watching for new files between runs, debounced by {BOLD}{WATCH_DEBOUNCE}{RESET} seconds")
+        asyncio.run(watch_async())
+        return
+
+    def scheduled_scan():
+        run_scan()
+        log_resident_memory("💤 Idle until the next run")
+
     # Run immediately on startup
-    run_scan()
+    scheduled_scan()
 
     # Schedule subsequent runs
-    schedule.every(RUN_INTERVAL).hours.do(run_scan)
+    schedule.every(RUN_INTERVAL).hours.do(scheduled_scan)
 
     while True:
         schedule.run_pending()